@@ -1,18 +1,51 @@
 import tkinter as tk
 from tkinter import messagebox
 from tkinter import ttk
+from tkinter import simpledialog
+from tkinter import filedialog
 import json
 import os
-from typing import Dict, Any, List
+import gzip
+import calendar
+import copy
+import csv
+import hashlib
+import hmac
+import secrets
+import heapq
+import asyncio
+import argparse
+import queue
+import threading
+import concurrent.futures
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+from contextlib import contextmanager
+try:
+    import fcntl # POSIX 的檔案鎖
+except ImportError:
+    fcntl = None
+    import msvcrt # Windows 的檔案鎖
+from array import array
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from itertools import accumulate, islice
+from typing import Dict, Any, List, Optional, Set
+
+try:
+    import openpyxl # 選用：匯出 Excel (.xlsx)
+except ImportError:
+    openpyxl = None
 
 # 引入 Matplotlib 相關模組
 import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import matplotlib.dates as mdates
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 
 # 引入 datetime 模組用於日期處理
 import datetime as dt
 from matplotlib.figure import Figure # 新增引入 Matplotlib Figure
-from collections import defaultdict # 新增引入 defaultdict
+from collections import defaultdict, OrderedDict
+from bisect import bisect_left, bisect_right
 
 # 設定中文顯示
 plt.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei'] # 確保中文字體顯示
@@ -20,7 +53,51 @@ plt.rcParams['axes.unicode_minus'] = False # 正常顯示負號
 
 # --- 檔案設定 ---
 USERS_FILE = "users.json"
+BUDGETS_FILE = "budgets.json" # 各類別的每月預算 (整數分)
+RECURRING_FILE = "recurring.json" # 週期交易規則 (發生日期不展開儲存)
 TRANSACTIONS_FILE = "transactions.json"
+JOURNAL_FILE = "transactions.journal" # 編輯日誌 (每行一筆 JSON)，完整存檔後清空
+JOURNAL_COMPACT_LIMIT = 200 # 日誌累積超過此筆數時改為完整存檔
+
+# 過去年度的交易封存為壓縮的分段檔 (每年一個，不再變動)，只有今年的交易存在 TRANSACTIONS_FILE
+ARCHIVE_DIR = "transactions_archive"
+ARCHIVE_MANIFEST = os.path.join(ARCHIVE_DIR, "manifest.json") # 各年度的期初/期末餘額與月/類別彙總
+
+# 多個程式同時開啟同一份帳本時，以鎖檔協調寫入，並定期檢查其他程式的變更
+LOCK_FILE = TRANSACTIONS_FILE + ".lock"
+SYNC_INTERVAL_MS = 2000 # 檢查外部變更的間隔 (毫秒)
+
+# --- 趨勢圖降採樣設定 ---
+TREND_MIN_POINTS = 100      # 降採樣後至少保留的點數
+TREND_MARKER_LIMIT = 120    # 點數不超過此值時才畫出圓點標記
+
+# --- 即時篩選設定 ---
+LIVE_FILTER_DELAY_MS = 300  # 停止輸入多久後才執行查詢 (毫秒)
+TABLE_STREAM_CHUNK = 500    # 表格每批插入的記錄數
+
+# --- 查詢快取設定 ---
+QUERY_CACHE_SIZE = 16       # 最多快取幾組篩選條件的結果
+ALL_VIEW_KEY = ('ALL',)     # 「顯示全部記錄」檢視在快取中的鍵
+
+# --- 週期交易設定 ---
+RECURRING_FREQUENCIES = {'每日': 'daily', '每週': 'weekly', '每月': 'monthly'}
+RECURRING_PROJECTION_DAYS = 90 # 「顯示全部記錄」與趨勢圖向未來預估的天數
+OPEN_END_DATE = "9999-12-31"   # 未指定結束日期的查詢 (「顯示全部記錄」、API 未帶 end)
+
+# --- 匯出設定 ---
+EXPORT_CHUNK = 1000         # 每批產生並寫入的資料列數
+EXPORT_QUEUE_CHUNKS = 4     # 等待寫入的批次上限 (限制匯出時的記憶體用量)
+EXPORT_POLL_MS = 50         # 更新進度的間隔 (毫秒)
+EXPORT_HEADER = ("日期", "類型", "金額", "類別", "備註", "餘額")
+
+# --- 本機 API 設定 ---
+API_HOST = "127.0.0.1"      # 只接受本機連線
+API_PORT = 8765
+API_BATCH_WINDOW = 0.05     # 寫入請求合併成一批的等待時間 (秒)
+API_POLL_MS = 50            # 與視窗一起執行時，Tk 執行緒處理 API 請求的間隔 (毫秒)
+API_MAX_BODY = 10 * 1024 * 1024 # 請求內容的大小上限 (位元組)
+API_ALLOWED_HOSTS = ("127.0.0.1", "localhost") # Host 標頭只接受這些名稱 (防止 DNS rebinding)
+API_TOKEN_FILE = "api_token"  # 每次啟動產生的存取權杖，本機工具由此讀取
 
 # --- 用戶資料處理函數 (略過，與原代碼相同) ---
 def load_users() -> Dict[str, str]:
@@ -43,6 +120,659 @@ def save_users(users: Dict[str, str]):
         print(f"ERROR: 無法儲存用戶檔案: {e}")
 
 
+# --- 預算資料處理函數 ---
+def load_budgets() -> Dict[str, int]:
+    """從 JSON 檔案載入各類別的每月預算 (整數分)。"""
+    if os.path.exists(BUDGETS_FILE):
+        try:
+            with open(BUDGETS_FILE, 'r', encoding='utf-8') as f:
+                return {k: int(v) for k, v in json.load(f).items()}
+        except Exception:
+            return {}
+    return {}
+
+def save_budgets(budgets: Dict[str, int]):
+    """將各類別的每月預算儲存到 JSON 檔案。"""
+    try:
+        write_json_atomic(BUDGETS_FILE, budgets)
+    except Exception as e:
+        print(f"ERROR: 無法儲存預算檔案: {e}")
+
+
+# --- 交易封存處理函數 ---
+def archive_segment_path(year: int) -> str:
+    return os.path.join(ARCHIVE_DIR, f"{year}.json.gz")
+
+def write_json_atomic(path: str, data: Any, compress: bool = False):
+    """先寫入暫存檔再以 os.replace 取代，避免寫到一半中斷時留下損毀的檔案。"""
+    tmp_path = path + ".tmp"
+    if compress:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+    else:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, path)
+
+@contextmanager
+def ledger_lock():
+    """
+    跨程式的建議鎖 (advisory lock)：讀取後寫回交易檔、日誌、封存、週期規則或預算前都要先取得，
+    避免兩個程式同時寫入而互相覆蓋。同一程式內不可巢狀取得。
+    """
+    with open(LOCK_FILE, 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def file_signature(path: str):
+    """檔案的 (修改時間, 大小)，用來便宜地判斷檔案是否被其他程式改過；檔案不存在時回傳 None。"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def stored_fingerprint(stored: Dict[str, Any]) -> tuple:
+    """檔案中一筆記錄的內容摘要，用於比對記錄是否被修改。"""
+    amount_cents = stored['amount_cents'] if 'amount_cents' in stored else to_cents(stored.get('amount', 0))
+    return (stored.get('date'), stored.get('type'), stored.get('category'), stored.get('description', ''), int(amount_cents))
+
+def merge_settings(local: Dict[Any, Any], stored: Dict[Any, Any], base: Dict[Any, Any]) -> bool:
+    """
+    以上次同步時的內容 (base) 把其他程式存檔的設定 (stored) 三方合併進 local (就地修改)，回傳 local 是否有變動：
+    其他程式新增、修改或刪除而本地沒改過的項目跟著更新；本地改過的項目保留本地版本。
+    """
+    changed = False
+    for key, value in stored.items():
+        if key not in base:
+            if key not in local:
+                local[key] = copy.deepcopy(value)
+                changed = True
+        elif value != base[key] and local.get(key) == base[key]:
+            local[key] = copy.deepcopy(value)
+            changed = True
+    for key in [k for k in base if k not in stored]:
+        if key in local and local[key] == base[key]:
+            del local[key]
+            changed = True
+    return changed
+
+def load_archive_manifest() -> Dict[str, Any]:
+    """載入封存索引；沒有封存時回傳空的索引。"""
+    if os.path.exists(ARCHIVE_MANIFEST):
+        with open(ARCHIVE_MANIFEST, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {'next_id': 1, 'years': {}}
+
+
+# --- 資料完整性校驗 ---
+# 存檔時為每個月份記錄 (筆數, 期末餘額, 內容摘要, 校驗鏈)；校驗鏈串起前一期，
+# 刪除或調換整個月份也能被發現。載入時只有摘要不符的月份才逐筆重算餘額找出問題。
+INTEGRITY_REPORT_LIMIT = 20 # 完整性警告最多列出的項目數
+
+def _digest_row(stored: Dict[str, Any]) -> list:
+    return [stored.get('id'), stored.get('date'), stored.get('type'), stored.get('category'),
+            stored.get('description', ''), stored.get('amount_cents'), stored.get('balance_cents')]
+
+def month_digest(rows: List[Dict[str, Any]]) -> str:
+    """一個月份 (依檔案中的順序) 所有記錄的 SHA-256 摘要。"""
+    h = hashlib.sha256()
+    for stored in rows:
+        h.update(json.dumps(_digest_row(stored), ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        h.update(b"\n")
+    return h.hexdigest()
+
+def chain_hash(previous: str, digest: str, closing_balance_cents: int) -> str:
+    return hashlib.sha256(f"{previous}:{digest}:{closing_balance_cents}".encode('utf-8')).hexdigest()
+
+def group_by_month(stored_records: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    months: Dict[str, List[Dict[str, Any]]] = OrderedDict()
+    for stored in stored_records:
+        months.setdefault(str(stored.get('date', ''))[:7], []).append(stored)
+    return months
+
+def period_checksums(stored_records: List[Dict[str, Any]], opening_balance_cents: int) -> List[Dict[str, Any]]:
+    """存檔用：每個月份的筆數、期末餘額、內容摘要與校驗鏈 (記錄需已按日期排序)。"""
+    periods = []
+    chain = chain_hash('', '', opening_balance_cents)
+    for month, rows in group_by_month(stored_records).items():
+        digest = month_digest(rows)
+        closing = rows[-1]['balance_cents']
+        chain = chain_hash(chain, digest, closing)
+        periods.append({'month': month, 'count': len(rows), 'closing_balance_cents': closing,
+                        'digest': digest, 'chain': chain})
+    return periods
+
+def verify_periods(stored_records: List[Dict[str, Any]], periods: List[Dict[str, Any]],
+                   opening_balance_cents: int, label: str) -> List[str]:
+    """
+    依存檔時的月份校驗資料檢查記錄，回傳問題描述 (空列表表示通過)。
+    摘要相符的月份直接採用其期末餘額；只有不符的月份才從前一期的期末餘額逐筆重算，
+    並指出儲存餘額開始出錯的記錄，而不是默默地重新計算整本帳。
+    """
+    problems = []
+    by_month = group_by_month(stored_records)
+    chain = chain_hash('', '', opening_balance_cents)
+    running = opening_balance_cents
+    for period in periods:
+        month = period['month']
+        rows = by_month.pop(month, [])
+        if period.get('chain') != chain_hash(chain, period['digest'], period['closing_balance_cents']):
+            problems.append(f"{label} {month}: 校驗鏈中斷 (校驗資料被修改，或前面的月份被刪除/調換)")
+            if rows: # 前一期不可信，改由本月第一筆的儲存餘額推回期初，避免誤差一路傳下去
+                first = rows[0]
+                first_amount = first.get('amount_cents', 0)
+                running = first.get('balance_cents', running) - (-first_amount if first.get('type') == '支出' else first_amount)
+        chain = period.get('chain', '')
+
+        if len(rows) == period['count'] and month_digest(rows) == period['digest']:
+            running = period['closing_balance_cents']
+            continue
+
+        # 摘要不符：從前一期的期末餘額逐筆重算，只回報誤差開始改變的記錄
+        month_problems = []
+        if len(rows) != period['count']:
+            month_problems.append(f"有 {len(rows)} 筆記錄，校驗資料記錄為 {period['count']} 筆")
+        offset = 0
+        for i, stored in enumerate(rows, 1):
+            amount_cents = stored.get('amount_cents', 0)
+            running += -amount_cents if stored.get('type') == '支出' else amount_cents
+            stored_offset = stored.get('balance_cents', running) - running
+            if stored_offset != offset and stored_offset != 0:
+                month_problems.append(f"第 {i} 筆 (id={stored.get('id')}, {stored.get('date')}) 儲存的餘額為 "
+                                      f"{format_cents(stored.get('balance_cents', 0))}，依金額應為 {format_cents(running)}")
+            offset = stored_offset
+        if rows and rows[-1].get('balance_cents') != period['closing_balance_cents']:
+            month_problems.append(f"期末餘額為 {format_cents(rows[-1].get('balance_cents', 0))}，"
+                                  f"校驗資料記錄為 {format_cents(period['closing_balance_cents'])}")
+        if not month_problems:
+            month_problems.append("內容與校驗摘要不符 (日期、類別或備註可能被手動修改)")
+        problems.extend(f"{label} {month}: {p}" for p in month_problems)
+        running = period['closing_balance_cents']
+
+    for month, rows in by_month.items():
+        problems.append(f"{label} {month}: {len(rows)} 筆記錄沒有校驗資料 (可能是手動加入的記錄)")
+    return problems
+
+
+# --- 匯出 ---
+def _export_chunks(chunk_queue: "queue.Queue", cancel: threading.Event):
+    """依序取出待寫入的資料列批次，直到收到結束標記 (None) 或被取消。"""
+    while True:
+        chunk = chunk_queue.get()
+        if chunk is None or cancel.is_set():
+            return
+        yield chunk
+
+def run_export_writer(path: str, chunk_queue: "queue.Queue", state: Dict[str, Any]):
+    """
+    (背景執行緒) 將佇列中的資料列分批寫入 CSV 或 XLSX。
+    先寫到暫存檔，完成後才取代目標檔案；取消或失敗時刪除暫存檔。
+    state: written (已寫入列數)、cancel (threading.Event)、error、done。
+    """
+    tmp_path = path + ".tmp"
+    try:
+        chunks = _export_chunks(chunk_queue, state['cancel'])
+        if path.lower().endswith('.xlsx'):
+            workbook = openpyxl.Workbook(write_only=True) # 只寫模式：資料列直接串流到暫存檔
+            sheet = workbook.create_sheet("交易記錄")
+            sheet.append(EXPORT_HEADER)
+            for chunk in chunks:
+                for row in chunk:
+                    sheet.append(row)
+                state['written'] += len(chunk)
+            if not state['cancel'].is_set():
+                workbook.save(tmp_path)
+        else:
+            # utf-8-sig 讓 Excel 直接開啟 CSV 時能正確顯示中文
+            with open(tmp_path, 'w', encoding='utf-8-sig', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(EXPORT_HEADER)
+                for chunk in chunks:
+                    writer.writerows(chunk)
+                    state['written'] += len(chunk)
+
+        if state['cancel'].is_set():
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except Exception as e:
+        state['error'] = e
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    finally:
+        state['done'] = True
+
+
+# --- 圖表輔助函數 ---
+def lttb_downsample(xs: List[float], ys: List[float], threshold: int):
+    """
+    以 LTTB (Largest-Triangle-Three-Buckets) 演算法將折線降採樣到 threshold 個點。
+    保留首尾兩點，並在每個區間挑選與前後點構成最大三角形面積的點，
+    因此峰值與谷值 (餘額的最高/最低點) 會被保留下來。
+    """
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(xs), list(ys)
+
+    sampled_x = [xs[0]]
+    sampled_y = [ys[0]]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0 # 上一個被選中的點
+
+    for i in range(threshold - 2):
+        # 下一個區間的平均點 (作為三角形的第三個頂點)
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        # 在目前區間中找出面積最大的點
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax_, ay_ = xs[a], ys[a]
+        max_area = -1.0
+        chosen = start
+        for j in range(start, end):
+            area = abs((ax_ - avg_x) * (ys[j] - ay_) - (ax_ - xs[j]) * (avg_y - ay_))
+            if area > max_area:
+                max_area = area
+                chosen = j
+
+        sampled_x.append(xs[chosen])
+        sampled_y.append(ys[chosen])
+        a = chosen
+
+    sampled_x.append(xs[-1])
+    sampled_y.append(ys[-1])
+    return sampled_x, sampled_y
+
+
+# --- 備註全文檢索 ---
+def description_grams(text: str) -> Set[str]:
+    """
+    將文字切成單字 (unigram) 與雙字 (bigram) 片段。
+    中文沒有空白分詞，因此以字元 n-gram 作為索引詞，英數字也一併適用。
+    """
+    grams: Set[str] = set()
+    for word in text.lower().split():
+        grams.update(word)
+        grams.update(word[i:i + 2] for i in range(len(word) - 1))
+    return grams
+
+
+class DescriptionIndex:
+    """
+    備註 (description) 的倒排索引：索引詞 -> 交易 id 集合。
+    新增/刪除交易時逐筆維護，查詢時只需對少數候選記錄做子字串確認。
+    """
+    def __init__(self):
+        self.postings: Dict[str, Set[int]] = defaultdict(set)
+        self.texts: Dict[int, str] = {}
+
+    def add(self, record_id: int, text: str):
+        normalized = text.lower()
+        if not normalized.strip():
+            return
+        self.texts[record_id] = normalized
+        for gram in description_grams(normalized):
+            self.postings[gram].add(record_id)
+
+    def remove(self, record_id: int):
+        normalized = self.texts.pop(record_id, None)
+        if normalized is None:
+            return
+        for gram in description_grams(normalized):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(record_id)
+                if not ids:
+                    del self.postings[gram]
+
+    def search(self, query: str) -> Set[int]:
+        """回傳備註同時包含所有關鍵字 (以空白分隔) 的交易 id。"""
+        result: Optional[Set[int]] = None
+        for keyword in query.lower().split():
+            # 單一字元直接查 unigram；較長的關鍵字以所有 bigram 的交集作為候選
+            grams = [keyword] if len(keyword) == 1 else [keyword[i:i + 2] for i in range(len(keyword) - 1)]
+            candidates: Optional[Set[int]] = None
+            for gram in sorted(grams, key=lambda g: len(self.postings.get(g, ()))):
+                ids = self.postings.get(gram)
+                if not ids:
+                    return set()
+                candidates = set(ids) if candidates is None else candidates & ids
+                if not candidates:
+                    return set()
+
+            # bigram 交集可能誤判 (例如字元順序不同)，以子字串確認
+            matched = {i for i in candidates if keyword in self.texts[i]}
+            result = matched if result is None else result & matched
+            if not result:
+                return set()
+        return result if result is not None else set()
+
+
+# --- 查詢結果快取 ---
+class QueryCache:
+    """
+    以篩選條件為鍵的 LRU 快取，每個項目保存篩選出的交易 id 列表與已計算的圖表彙總。
+    帳本一有變動就呼叫 invalidate 清空所有項目。
+    """
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+
+    def get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key) # 標記為最近使用
+        return entry
+
+    def put(self, key: tuple, entry: Dict[str, Any]):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False) # 移除最久未使用的項目
+
+    def invalidate(self):
+        """帳本已變動：清空所有快取項目。"""
+        self.entries.clear()
+
+
+# --- 金額 (整數分) ---
+MAX_CENTS = 2 ** 63 - 1 # 金額欄位為 int64
+
+def check_cents(cents: int) -> int:
+    """確認整數分能存入 int64 金額欄位，超出範圍時拋出 ValueError。"""
+    if not -MAX_CENTS <= cents <= MAX_CENTS:
+        raise ValueError(f"金額超出範圍: {format_cents(cents)}")
+    return cents
+
+def to_cents(value) -> int:
+    """將金額 (字串或數字，單位：元) 轉為整數分；以 Decimal 四捨五入，避免浮點誤差。"""
+    try:
+        cents = (Decimal(str(value).replace(',', '').strip()) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+        return check_cents(int(cents))
+    except (InvalidOperation, ValueError, OverflowError):
+        raise ValueError(f"無效的金額: {value}")
+
+def format_cents(cents: int, grouping: bool = True) -> str:
+    """將整數分格式化為顯示用的金額字串 (例如 123456 -> '1,234.56')。"""
+    sign = '-' if cents < 0 else ''
+    units, remainder = divmod(abs(cents), 100)
+    units_text = f"{units:,}" if grouping else str(units)
+    return f"{sign}{units_text}.{remainder:02d}"
+
+
+class MoneyColumns:
+    """
+    交易的金額欄位 (單位：分，int64 的 array('q'))。
+    signed 為收入正、支出負的金額，balance 為該筆交易後的餘額。
+    每筆交易 id 對應欄位中的一個位置 (slots)，刪除後的位置放入 free 重複使用，
+    因此記憶體只與記錄筆數有關，不受 id 大小影響。
+    記錄排序或搬移時欄位不需變動；重算餘額只要依日期順序對 signed 做整數累加。
+    """
+    def __init__(self):
+        self.signed = array('q')
+        self.balance = array('q')
+        self.slots: Dict[int, int] = {} # 交易 id -> 欄位位置
+        self.free: List[int] = []       # 可重複使用的位置
+
+    def _slot(self, record_id: int) -> int:
+        slot = self.slots.get(record_id)
+        if slot is None:
+            if self.free:
+                slot = self.free.pop()
+            else:
+                slot = len(self.signed)
+                self.signed.append(0)
+                self.balance.append(0)
+            self.slots[record_id] = slot
+        return slot
+
+    def set_amount(self, record_id: int, amount_cents: int, is_expense: bool):
+        signed = -amount_cents if is_expense else amount_cents
+        self.signed[self._slot(record_id)] = signed
+
+    def signed_of(self, record_id: int) -> int:
+        slot = self.slots.get(record_id)
+        return self.signed[slot] if slot is not None else 0
+
+    def balance_of(self, record_id: int) -> int:
+        slot = self.slots.get(record_id)
+        return self.balance[slot] if slot is not None else 0
+
+    def amount(self, record_id: int) -> int:
+        return abs(self.signed_of(record_id))
+
+    def clear(self, record_id: int):
+        slot = self.slots.pop(record_id, None)
+        if slot is not None:
+            self.signed[slot] = 0
+            self.balance[slot] = 0
+            self.free.append(slot)
+
+    @staticmethod
+    def _check_range(low: int, high: int):
+        if low < -MAX_CENTS or high > MAX_CENTS:
+            raise ValueError("餘額超出範圍 (int64)，無法記錄這筆金額")
+
+    def recompute(self, ids: List[int], start_balance: int = 0) -> int:
+        """
+        依給定順序重算餘額，回傳最後的餘額。
+        先算出全部餘額並檢查範圍，超出 int64 時拋出 ValueError，欄位保持不變。
+        """
+        signed, balance = self.signed, self.balance
+        slots = [self.slots[i] for i in ids]
+        totals = list(accumulate((signed[i] for i in slots), initial=start_balance))
+        self._check_range(min(totals), max(totals))
+        for slot, running in zip(slots, totals[1:]): # 第一個值是起始餘額本身
+            balance[slot] = running
+        return totals[-1]
+
+    def check_shift(self, ids: List[int], delta: int):
+        """確認多筆交易的餘額加上 delta 後仍在 int64 範圍內，否則拋出 ValueError。"""
+        if ids and delta:
+            balances = [self.balance[self.slots[i]] for i in ids]
+            self._check_range(min(balances) + delta, max(balances) + delta)
+
+    def shift(self, ids: List[int], delta: int):
+        """把 delta 加到多筆交易的餘額上 (用於只改金額的編輯)；超出範圍時拋出 ValueError，欄位保持不變。"""
+        self.check_shift(ids, delta)
+        balance, slots = self.balance, self.slots
+        for record_id in ids:
+            balance[slots[record_id]] += delta
+
+
+# --- 週期交易 ---
+def add_months(date_obj: dt.date, months: int, day: int) -> dt.date:
+    """date_obj 之後 months 個月的 day 日；該月沒有這一天時取月底 (例如 1/31 的下個月為 2/28)。"""
+    year, month_index = divmod(date_obj.year * 12 + date_obj.month - 1 + months, 12)
+    return dt.date(year, month_index + 1, min(day, calendar.monthrange(year, month_index + 1)[1]))
+
+class RecurringRules:
+    """
+    週期交易規則 (每日/每週/每月，可設結束日期)。
+    發生日期不展開儲存：查詢、餘額與圖表需要時才由產生器即時計算；
+    某一次被編輯 (實體化為一般記錄) 或刪除時，只把該日期加入規則的略過列表。
+    """
+
+    def __init__(self):
+        self.rules: Dict[int, Dict[str, Any]] = {}
+        self.next_id = 1
+
+    @classmethod
+    def load(cls, path: str = RECURRING_FILE) -> 'RecurringRules':
+        rules = cls()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for rule in data.get('rules', []):
+                # 舊版可能存了未補零的日期 (2026-3-5)，fromisoformat 無法解析
+                for key in ('start', 'end'):
+                    if rule.get(key):
+                        rule[key] = dt.datetime.strptime(rule[key], "%Y-%m-%d").date().isoformat()
+                rules.rules[rule['id']] = rule
+            rules.next_id = max(data.get('next_id', 1), max(rules.rules, default=0) + 1)
+        return rules
+
+    def save(self, path: str = RECURRING_FILE):
+        write_json_atomic(path, {'next_id': self.next_id, 'rules': list(self.rules.values())})
+
+    def add(self, rule: Dict[str, Any]) -> Dict[str, Any]:
+        """新增規則 (start, end, freq, type, category, description, amount_cents)，回傳含 id 的規則。"""
+        rule = dict(rule, id=self.next_id, exceptions=[])
+        self.rules[rule['id']] = rule
+        self.next_id += 1
+        return rule
+
+    def remove(self, rule_id: int):
+        self.rules.pop(rule_id, None)
+
+    def snapshot(self) -> Dict[int, Dict[str, Any]]:
+        """目前規則的複本，作為下次與其他程式合併時的基準。"""
+        return copy.deepcopy(self.rules)
+
+    def merge(self, stored: 'RecurringRules', base: Dict[int, Dict[str, Any]]) -> bool:
+        """
+        併入其他程式存檔的規則 (base 為上次同步時的規則)，回傳是否有變動。
+        本地尚未存檔的新規則與其他程式新增的規則 id 相同時，本地規則改用新的 id。
+        """
+        for rule_id, rule in list(self.rules.items()):
+            if rule_id not in base and rule_id in stored.rules and stored.rules[rule_id] != rule:
+                del self.rules[rule_id]
+                new_id = max(self.next_id, stored.next_id)
+                self.rules[new_id] = dict(rule, id=new_id)
+                self.next_id = new_id + 1
+        self.next_id = max(self.next_id, stored.next_id)
+        return merge_settings(self.rules, stored.rules, base)
+
+    def end_before(self, rule_id: int, date_str: str):
+        """規則從 date_str 起不再發生 (結束日期設為前一天)，之前的發生保留；第一次就在 date_str 時刪除規則。"""
+        rule = self.rules[rule_id]
+        end_str = (dt.date.fromisoformat(date_str) - dt.timedelta(days=1)).isoformat()
+        if end_str < rule['start']:
+            self.remove(rule_id)
+            return
+        if not rule.get('end') or end_str < rule['end']:
+            rule['end'] = end_str
+        del rule['exceptions'][bisect_right(rule['exceptions'], end_str):]
+
+    def skip(self, rule_id: int, date_str: str):
+        """不再產生規則在 date_str 的這一次 (已刪除或已實體化)。"""
+        exceptions = self.rules[rule_id]['exceptions']
+        i = bisect_left(exceptions, date_str)
+        if i == len(exceptions) or exceptions[i] != date_str:
+            exceptions.insert(i, date_str)
+
+    @staticmethod
+    def _nth(rule: Dict[str, Any], n: int) -> dt.date:
+        """規則的第 n 次 (由 0 起算) 發生日期。"""
+        start = dt.date.fromisoformat(rule['start'])
+        if rule['freq'] == 'daily':
+            return start + dt.timedelta(days=n)
+        if rule['freq'] == 'weekly':
+            return start + dt.timedelta(days=7 * n)
+        return add_months(start, n, start.day)
+
+    @staticmethod
+    def _index_until(rule: Dict[str, Any], date_obj: dt.date) -> int:
+        """date_obj 當天或之前最後一次發生的序號 (不考慮結束日期與略過日期)；尚未開始時為 -1。"""
+        start = dt.date.fromisoformat(rule['start'])
+        if date_obj < start:
+            return -1
+        if rule['freq'] == 'daily':
+            return (date_obj - start).days
+        if rule['freq'] == 'weekly':
+            return (date_obj - start).days // 7
+        months = (date_obj.year - start.year) * 12 + date_obj.month - start.month
+        if add_months(start, months, start.day) > date_obj:
+            months -= 1
+        return months
+
+    def _last_index(self, rule: Dict[str, Any], date_str: str) -> int:
+        date_obj = dt.date.fromisoformat(date_str)
+        if rule.get('end'):
+            date_obj = min(date_obj, dt.date.fromisoformat(rule['end']))
+        return self._index_until(rule, date_obj)
+
+    def dates(self, rule: Dict[str, Any], start_str: str, end_str: str):
+        """規則在 [start_str, end_str] 內的發生日期 (產生器，跳過略過列表中的日期)。"""
+        n = max(self._index_until(rule, dt.date.fromisoformat(start_str)), 0)
+        if self._nth(rule, n).isoformat() < start_str:
+            n += 1
+        last = self._last_index(rule, end_str)
+        exceptions = rule['exceptions']
+        while n <= last:
+            date_str = self._nth(rule, n).isoformat()
+            n += 1
+            i = bisect_left(exceptions, date_str)
+            if i < len(exceptions) and exceptions[i] == date_str:
+                continue
+            yield date_str
+
+    @staticmethod
+    def occurrence(rule: Dict[str, Any], date_str: str) -> Dict[str, Any]:
+        """規則在 date_str 的一次發生，格式與一般記錄相同 (id 為字串，金額直接放在記錄中)。"""
+        return {
+            'id': f"R{rule['id']}:{date_str}",
+            'rule_id': rule['id'],
+            'date': date_str,
+            'type': rule['type'],
+            'category': rule['category'],
+            'description': rule['description'],
+            'amount_cents': rule['amount_cents'],
+        }
+
+    def _occurrence_stream(self, rule: Dict[str, Any], start_str: str, end_str: str):
+        for date_str in self.dates(rule, start_str, end_str):
+            yield self.occurrence(rule, date_str)
+
+    def occurrences(self, start_str: str, end_str: str, categories=frozenset(), keyword: str = '',
+                    horizon: Optional[str] = None):
+        """
+        所有規則在區間內的發生 (按日期排序的產生器)，可依類別與備註關鍵字篩選。
+        horizon：沒有結束日期的規則最多產生到這一天。
+        """
+        words = keyword.lower().split()
+        streams = [
+            self._occurrence_stream(rule, start_str,
+                                    end_str if horizon is None or rule.get('end') else min(end_str, horizon))
+            for rule in self.rules.values()
+            if (not categories or rule['category'] in categories)
+            and all(word in rule['description'].lower() for word in words)
+        ]
+        return heapq.merge(*streams, key=lambda r: r['date'])
+
+    def lookup(self, occurrence_id: str) -> Optional[Dict[str, Any]]:
+        """由表格 iid ("R<規則 id>:<日期>") 取回一次發生；規則已刪除時回傳 None。"""
+        rule_part, _, date_str = occurrence_id[1:].partition(':')
+        rule = self.rules.get(int(rule_part))
+        return self.occurrence(rule, date_str) if rule is not None else None
+
+    def total_until(self, date_str: str) -> int:
+        """date_str 當天 (含) 之前所有發生的淨額 (收入為正，單位：分)；以次數計算，不必逐一產生。"""
+        total = 0
+        for rule in self.rules.values():
+            count = self._last_index(rule, date_str) + 1 - bisect_right(rule['exceptions'], date_str)
+            if count > 0:
+                total += count * (-rule['amount_cents'] if rule['type'] == '支出' else rule['amount_cents'])
+        return total
+
+
 class LoginWindow:
     """ 登入/註冊視窗類別 (略過，與原代碼相同) """
     def __init__(self, master, on_success_callback):
@@ -184,19 +914,27 @@ class ExpenseTrackerApp:
 
     DATE_FORMAT = "%Y-%m-%d"
 
+    @classmethod
+    def normalize_date(cls, date_str: str) -> str:
+        """
+        驗證日期並轉為補零的 DATE_FORMAT 字串 (strptime 也接受 2026-3-5)。
+        篩選與排序都以字串比較日期，寫入帳本的日期必須先經過這裡；格式錯誤時拋出 ValueError。
+        """
+        return dt.datetime.strptime(date_str, cls.DATE_FORMAT).strftime(cls.DATE_FORMAT)
+
     def __init__(self, master):
         self.master = master
         master.title("💰 金錢追蹤器")
         master.geometry("1100x650")
         master.configure(bg='#00E3E3')
         self._sort_state = {}
+        self.query_cache = QueryCache()
+        self._current_view_entry: Optional[Dict[str, Any]] = None # 目前表格檢視對應的快取項目
+        self._live_filter_job = None # 即時篩選的 after 排程 id
+        self._last_filter = None # 上一次的篩選: (criteria, 結果列表)
+        self._stream_generation = 0 # 表格串流的世代編號，新的更新會讓舊的串流停止
         master.protocol("WM_DELETE_WINDOW", self.on_closing)
-        
-        self.balance = 0.0
-        self.transactions: List[Dict[str, Any]] = []
-        self.categories = ["飲食", "交通", "娛樂", "購物", "薪資", "投資", "其他"]
-        
-        self.load_transactions()
+        self._init_ledger()
 
         # 儲存目前顯示在表格中的交易列表 (用於圖表連動)
         self.current_filtered_transactions: List[Dict[str, Any]] = self.transactions
@@ -228,7 +966,7 @@ class ExpenseTrackerApp:
 
         tk.Label(self.balance_frame, text="💵 當前總餘額:", font=('Microsoft YaHei', 12), bg='white').pack(side=tk.LEFT, padx=5)
 
-        self.balance_var = tk.StringVar(value=f"{self.balance:.2f} 元")
+        self.balance_var = tk.StringVar(value=f"{format_cents(self.balance)} 元")
         self.balance_label = tk.Label(self.balance_frame, textvariable=self.balance_var, font=('Microsoft YaHei', 16, 'bold'), bg='white', fg=PRIMARY_COLOR)
         self.balance_label.pack(side=tk.RIGHT, padx=5)
 
@@ -264,7 +1002,17 @@ class ExpenseTrackerApp:
         self.description_entry = ttk.Entry(self.input_group, width=20)
         self.description_entry.grid(row=4, column=1, padx=5, pady=8, sticky='we')
         
-        ttk.Button(self.input_group, text="💾 儲存並新增記錄", command=self.add_transaction, style='TButton').grid(row=5, column=1, padx=5, pady=8, sticky='we')
+        # 週期交易 (Row 5-6)：選擇重複頻率時改為新增週期規則
+        tk.Label(self.input_group, text="重複:", bg='#F0F8FF').grid(row=5, column=0, padx=5, pady=8, sticky='w')
+        self.repeat_var = tk.StringVar(value="不重複")
+        ttk.Combobox(self.input_group, textvariable=self.repeat_var, values=["不重複"] + list(RECURRING_FREQUENCIES),
+                     state="readonly", width=15).grid(row=5, column=1, padx=5, pady=8, sticky='we')
+
+        tk.Label(self.input_group, text="結束日期:", bg='#F0F8FF').grid(row=6, column=0, padx=5, pady=8, sticky='w')
+        self.repeat_end_var = tk.StringVar(value="")
+        ttk.Entry(self.input_group, textvariable=self.repeat_end_var, width=20).grid(row=6, column=1, padx=5, pady=8, sticky='we')
+
+        ttk.Button(self.input_group, text="💾 儲存並新增記錄", command=self.add_transaction, style='TButton').grid(row=7, column=1, padx=5, pady=8, sticky='we')
 
         self.input_group.grid_columnconfigure(1, weight=1)
 
@@ -291,16 +1039,33 @@ class ExpenseTrackerApp:
         self.end_date_var = tk.StringVar(value=today_date)
         ttk.Entry(self.search_group, textvariable=self.end_date_var, width=15).grid(row=3, column=1, padx=5, pady=5, sticky='we')
 
+        # --- 備註關鍵字 (多個關鍵字以空白分隔) ---
+        tk.Label(self.search_group, text="備註關鍵字:", bg='#F0F8FF').grid(row=4, column=0, padx=5, pady=5, sticky='w')
+        self.keyword_var = tk.StringVar(value="")
+        ttk.Entry(self.search_group, textvariable=self.keyword_var, width=15).grid(row=4, column=1, padx=5, pady=5, sticky='we')
+
+        # --- 即時篩選：欄位變動後自動查詢 ---
+        self.live_filter_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.search_group, text="⚡ 即時篩選 (輸入時自動查詢)", variable=self.live_filter_var,
+                       command=self.schedule_live_filter, bg='#F0F8FF').grid(row=5, column=0, columnspan=2, padx=5, sticky='w')
+
+        for var in (self.start_date_var, self.end_date_var, self.keyword_var):
+            var.trace_add('write', self.schedule_live_filter)
+        self.category_listbox.bind('<<ListboxSelect>>', self.schedule_live_filter)
+
         # --- 按鈕 ---
         ttk.Button(self.search_group,
                    text="🚀 執行查詢",
                    command=self.search_transactions_by_date,
-                   style='TButton').grid(row=4, column=0, columnspan=2, pady=10, sticky='we')
+                   style='TButton').grid(row=6, column=0, columnspan=2, pady=10, sticky='we')
 
         ttk.Button(self.search_group,
                    text="🔁 顯示全部記錄/重設篩選",
                    command=lambda: self.reset_view_to_all(),
-                   style='TButton').grid(row=5, column=0, columnspan=2, pady=(0, 5), sticky='we')
+                   style='TButton').grid(row=7, column=0, columnspan=2, pady=(0, 5), sticky='we')
+
+        self.filter_status_var = tk.StringVar(value="")
+        tk.Label(self.search_group, textvariable=self.filter_status_var, bg='#F0F8FF', fg='#555').grid(row=8, column=0, columnspan=2, padx=5, sticky='w')
 
         self.search_group.grid_columnconfigure(1, weight=1)
         self.search_group.grid_rowconfigure(1, weight=1)
@@ -350,9 +1115,17 @@ class ExpenseTrackerApp:
         self.tree.tag_configure('income_tag', background='#E6FFE6', foreground='green')
         self.tree.tag_configure('expense_tag', background='#FFE6E6', foreground='red')
 
+        # 雙擊表格中的記錄開啟編輯視窗
+        self.tree.bind('<Double-1>', self.show_edit_dialog)
+
         self.delete_frame = tk.Frame(self.table_tab)
         self.delete_frame.pack(fill='x', pady=10)
 
+        ttk.Button(self.delete_frame,
+                   text="📤 匯出目前檢視 (CSV/Excel)",
+                   command=self.export_current_view,
+                   style='TButton').pack(fill='x', pady=(0, 5))
+
         ttk.Button(self.delete_frame,
                    text="🗑️ 刪除選定記錄",
                    command=self.delete_transaction,
@@ -388,12 +1161,91 @@ class ExpenseTrackerApp:
 
         self.chart_canvas.bind("<Configure>", _on_canvas_configure)
 
+        # --- 標籤頁 3: 每月預算 (Budget) ---
+        self.budget_tab = ttk.Frame(self.notebook, padding="10 10 10 0")
+        self.notebook.add(self.budget_tab, text='🎯 每月預算', sticky='nsew')
+
+        tk.Label(self.budget_tab, text="🎯 各類別每月預算", font=('Microsoft YaHei', 14, 'bold'), fg=PRIMARY_COLOR).pack(pady=5)
+
+        budget_month_frame = tk.Frame(self.budget_tab)
+        budget_month_frame.pack(fill='x', pady=5)
+        tk.Label(budget_month_frame, text="月份 (YYYY-MM):").pack(side=tk.LEFT, padx=5)
+        self.budget_month_var = tk.StringVar(value=dt.datetime.now().strftime("%Y-%m"))
+        ttk.Entry(budget_month_frame, textvariable=self.budget_month_var, width=10).pack(side=tk.LEFT, padx=5)
+        self.budget_month_var.trace_add('write', lambda *args: self.update_budget_panel(load_history=True))
+        tk.Label(budget_month_frame, text="雙擊類別以設定預算", fg='#555').pack(side=tk.RIGHT, padx=5)
+
+        self.budget_tree = ttk.Treeview(self.budget_tab, columns=("Category", "Budget", "Spent", "Remaining", "Usage"), show='headings', height=10)
+        for col, text, anchor in (("Category", "類別", 'w'), ("Budget", "預算", 'e'), ("Spent", "已支出", 'e'),
+                                  ("Remaining", "剩餘", 'e'), ("Usage", "使用率", 'center')):
+            self.budget_tree.heading(col, text=text)
+            self.budget_tree.column(col, width=110, anchor=anchor)
+        self.budget_tree.pack(fill='both', expand=True, pady=5)
+        self.budget_tree.tag_configure('over_tag', background='#FFE6E6', foreground='red')
+        self.budget_tree.tag_configure('near_tag', background='#FFF5E0', foreground='#CC7700')
+        self.budget_tree.bind('<Double-1>', self.edit_budget)
+
         # 綁定 Notebook 標籤切換事件，用於重新繪製圖表
         self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_change)
 
         self.recalculate_balance()
         self._setup_column_sorting()
 
+        # 定期檢查其他程式對帳本的修改
+        self.master.after(SYNC_INTERVAL_MS, self.check_external_changes)
+
+    def _init_ledger(self):
+        """建立帳本狀態並載入交易 (視窗與無視窗的 API 伺服器共用)。"""
+        self.balance = 0 # 單位：分
+        self.transactions: List[Dict[str, Any]] = []
+        self.categories = ["飲食", "交通", "娛樂", "購物", "薪資", "投資", "其他"]
+
+        # 每筆交易都有穩定的 id，供表格 iid 與備註索引使用
+        self.records_by_id: Dict[int, Dict[str, Any]] = {}
+        self._next_record_id = 1
+        self.description_index = DescriptionIndex()
+        self.money = MoneyColumns() # 金額與餘額欄位 (整數分)，以交易 id 查詢
+        # 每月各類別的支出累計 (整數分)，新增/刪除/修改時 O(1) 更新，預算面板直接讀取
+        self.month_spending: Dict[tuple, int] = defaultdict(int) # (YYYY-MM, 類別) -> 支出
+        self.budgets = load_budgets()
+        try:
+            self.recurring = RecurringRules.load()
+        except Exception as e:
+            self.recurring = RecurringRules()
+            self.report_error("載入錯誤", f"無法讀取週期交易規則 {RECURRING_FILE}: {e}")
+        # 預算與週期規則上次與檔案同步時的內容 (與其他程式三方合併的基準)
+        self._synced_budgets: Dict[str, int] = dict(self.budgets)
+        self._synced_rules: Dict[int, Dict[str, Any]] = self.recurring.snapshot()
+        self.archive_manifest: Dict[str, Any] = {'next_id': 1, 'years': {}}
+        self._loaded_archive_years: Set[int] = set() # 已從封存載入記憶體的年度
+        self._dirty_years: Set[int] = set() # 有變動、存檔時需重寫分段檔的年度
+        self._base_balance = 0 # 已載入記錄之前 (未載入的封存年度) 的期末餘額
+        self._viewing_all = True # 目前是否為「顯示全部記錄」檢視 (圖表會加入未載入年度的彙總)
+        self._pending_trend_xlim = None # 載入封存後要還原的折線圖顯示範圍
+        self._history_load_pending = False
+        # 與其他程式同步的狀態：上次同步時檔案中的序號、檔案簽章、日誌讀取位置與各來源的記錄摘要
+        self._store_sequence = 0
+        self._store_stat = None
+        self._journal_offset = 0
+        self._synced: Dict[str, Dict[int, tuple]] = {} # 來源 ('hot' 或年度) -> {id: 內容摘要}
+        self._current_criteria = None # 目前篩選檢視的條件 (外部變更後重新查詢用)
+        self._journal_entries = 0 # 上次完整存檔後寫入日誌的筆數
+        self._integrity_problems: List[str] = [] # 載入時校驗發現、尚未回報的問題
+
+        self.load_transactions()
+
+    @classmethod
+    def headless(cls) -> 'ExpenseTrackerApp':
+        """不建立視窗的帳本，供本機 API 伺服器單獨執行；畫面相關的更新都會略過。"""
+        app = cls.__new__(cls)
+        app.master = None
+        app.query_cache = QueryCache()
+        app._current_view_entry = None
+        app._last_filter = None
+        app._init_ledger()
+        app._recompute_all_balances()
+        return app
+
     def _setup_column_sorting(self):
         """將排序函數綁定到 Treeview 的所有欄位標題上。"""
         
@@ -422,46 +1274,109 @@ class ExpenseTrackerApp:
     def reset_view_to_all(self):
         """重設篩選器，顯示所有記錄並更新圖表。"""
         self.category_listbox.selection_clear(0, tk.END) # 清除類別選中
+        self.keyword_var.set("") # 清除備註關鍵字
+        self._cancel_live_filter()
+        self._last_filter = None
+        self.filter_status_var.set("")
 
         # 顯示所有記錄
-        self.update_transaction_list(self.transactions)
+        self._viewing_all = True
+        self._current_view_entry = self._all_view_entry()
+        self.update_transaction_list(self.all_view_records())
         self.update_chart_if_active()
 
-    def search_transactions_by_date(self):
-        """根據日期範圍和類別篩選交易記錄並更新表格及圖表"""
-
-        start_date_str = self.start_date_var.get()
-        end_date_str = self.end_date_var.get()
-        selected_categories = self.get_selected_categories()
+    def read_filter_criteria(self):
+        """
+        讀取篩選器欄位，回傳 (起始日期, 結束日期, 類別集合, 關鍵字)。
+        日期以 DATE_FORMAT 字串表示 (可直接以字串比較)；格式錯誤時拋出 ValueError。
+        """
+        return (self.normalize_date(self.start_date_var.get().strip()),
+                self.normalize_date(self.end_date_var.get().strip()),
+                frozenset(self.get_selected_categories()),
+                self.keyword_var.get().strip())
+
+    @staticmethod
+    def is_refinement(new_criteria, old_criteria) -> bool:
+        """判斷新的篩選條件是否為舊條件的細化 (結果必為舊結果的子集)。"""
+        if old_criteria is None:
+            return False
+        new_start, new_end, new_categories, new_keyword = new_criteria
+        old_start, old_end, old_categories, old_keyword = old_criteria
+
+        if new_start < old_start or new_end > old_end:
+            return False
+        # 舊條件未限制類別時任何類別都算細化；否則新類別必須是舊類別的非空子集
+        if old_categories and (not new_categories or not new_categories <= old_categories):
+            return False
+        # 舊的每個關鍵字都必須出現在某個新關鍵字中
+        new_words = new_keyword.lower().split()
+        return all(any(old in new for new in new_words) for old in old_keyword.lower().split())
+
+    def filter_transactions(self, criteria, base: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        依篩選條件過濾交易。base 為 None 時掃描整本帳；
+        若新條件是上一次條件的細化，可傳入上一次的結果只在其中縮小範圍。
+        """
+        start_str, end_str, categories, keyword = criteria
+
+        # 有關鍵字時先由倒排索引取得候選記錄，只需檢查這些記錄的日期與類別
+        matched_ids = self.description_index.search(keyword) if keyword else None
+        if base is None:
+            if matched_ids is None:
+                base = self.transactions
+            else:
+                base = sorted((self.records_by_id[i] for i in matched_ids), key=lambda r: r['date'])
+
+        return [
+            record for record in base
+            if start_str <= record['date'] <= end_str # 包含結束日期當天所有記錄
+            and 'rule_id' not in record # 週期交易由 with_occurrences 另外併入
+            and (not categories or record['category'] in categories)
+            and (matched_ids is None or record['id'] in matched_ids)
+        ]
+
+    def query_view(self, criteria, base: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        取得篩選結果，並將其設為目前檢視的快取項目。
+        相同條件再次查詢時直接由快取的 id 列表還原，不必重新掃描帳本。
+        """
+        entry = self.query_cache.get(criteria)
+        if entry is None:
+            records = self.filter_transactions(criteria, base)
+            entry = {'ids': [r['id'] for r in records]}
+            self.query_cache.put(criteria, entry)
+        else:
+            records = [self.records_by_id[i] for i in entry['ids']]
+        self._viewing_all = False
+        self._current_criteria = criteria
+        self._current_view_entry = entry
+        return self.with_occurrences(records, criteria)
+
+    def _all_view_entry(self) -> Dict[str, Any]:
+        """「顯示全部記錄」檢視的快取項目 (記錄即為 self.transactions，不需保存 id)。"""
+        entry = self.query_cache.get(ALL_VIEW_KEY)
+        if entry is None:
+            entry = {}
+            self.query_cache.put(ALL_VIEW_KEY, entry)
+        return entry
 
+    def search_transactions_by_date(self):
+        """根據日期範圍、類別與備註關鍵字篩選交易記錄並更新表格及圖表"""
         try:
-            start_date = dt.datetime.strptime(start_date_str, self.DATE_FORMAT).date()
-            end_date = dt.datetime.strptime(end_date_str, self.DATE_FORMAT).date()
+            criteria = self.read_filter_criteria()
 
-            # 將結束日期調整為當天結束 (包含當天所有記錄)
-            end_date = end_date + dt.timedelta(days=1)
-
-            if start_date > end_date:
+            if criteria[0] > criteria[1]:
                 messagebox.showwarning("日期錯誤", "起始日期不能晚於結束日期！", parent=self.master)
                 return
 
-            filtered_transactions = []
-            for record in self.transactions:
-                record_date = dt.datetime.strptime(record['date'], self.DATE_FORMAT).date()
-
-                # 1. 檢查日期範圍
-                date_match = start_date <= record_date < end_date # 使用 < end_date
-
-                # 2. 檢查類別 (如果 selected_categories 非空才進行篩選)
-                category_match = True
-                if selected_categories:
-                    category_match = record['category'] in selected_categories
-
-                if date_match and category_match:
-                    filtered_transactions.append(record)
+            self._cancel_live_filter()
+            self.ensure_history_loaded(criteria[0]) # 起始日期落在封存年度時先載入
+            filtered_transactions = self.query_view(criteria)
+            self._last_filter = (criteria, filtered_transactions)
 
             self.update_transaction_list(filtered_transactions)
             self.update_chart_if_active()
+            self.filter_status_var.set(f"找到 {len(filtered_transactions)} 筆記錄")
 
             messagebox.showinfo("查詢結果", f"在指定條件下，找到 {len(filtered_transactions)} 筆記錄。", parent=self.master)
 
@@ -470,34 +1385,652 @@ class ExpenseTrackerApp:
         except Exception as e:
             messagebox.showerror("查詢錯誤", f"發生錯誤: {e}", parent=self.master)
 
+    # --------------------------------------------------------------------
+    # --- 即時篩選 (輸入時自動查詢) ---
+    # --------------------------------------------------------------------
+
+    def schedule_live_filter(self, *args):
+        """篩選欄位變動時呼叫；即時模式下延遲一小段時間再查詢，連續輸入只會查詢一次。"""
+        if not self.live_filter_var.get():
+            return
+        self._cancel_live_filter()
+        self._live_filter_job = self.master.after(LIVE_FILTER_DELAY_MS, self.run_live_filter)
+
+    def _cancel_live_filter(self):
+        if self._live_filter_job is not None:
+            self.master.after_cancel(self._live_filter_job)
+            self._live_filter_job = None
+
+    def run_live_filter(self):
+        """執行即時查詢：若條件是上一次的細化，只在上一次的結果中縮小範圍。"""
+        self._live_filter_job = None
+        try:
+            criteria = self.read_filter_criteria()
+        except ValueError:
+            # 使用者可能還在輸入日期，不跳出錯誤視窗
+            self.filter_status_var.set(f"⌛ 日期格式需為 {self.DATE_FORMAT}")
+            return
+        if criteria[0] > criteria[1]:
+            self.filter_status_var.set("⚠️ 起始日期不能晚於結束日期")
+            return
+
+        self.ensure_history_loaded(criteria[0]) # 起始日期落在封存年度時先載入 (會讓上一次的結果失效)
+        if self._last_filter is not None and criteria == self._last_filter[0]:
+            return # 條件未變，不需重新查詢
+
+        base = None
+        if self._last_filter is not None and self.is_refinement(criteria, self._last_filter[0]):
+            base = self._last_filter[1]
+
+        filtered_transactions = self.query_view(criteria, base)
+        self._last_filter = (criteria, filtered_transactions)
+        self.filter_status_var.set(f"找到 {len(filtered_transactions)} 筆記錄")
+
+        # 分批串流到表格，完成後再更新圖表
+        self.update_transaction_list(filtered_transactions, on_done=self.update_chart_if_active)
+
     def load_transactions(self):
-        """從檔案載入交易，並處理舊數據兼容性"""
+        """從檔案載入今年 (熱分區) 的交易與封存索引，並處理舊數據兼容性；過去年度在需要時才載入"""
+        try:
+            self.archive_manifest = load_archive_manifest()
+            self._next_record_id = max(self._next_record_id, self.archive_manifest.get('next_id', 1))
+        except Exception as e:
+            self.report_error("載入錯誤", f"無法讀取封存索引 {ARCHIVE_MANIFEST}: {e}")
+
         if os.path.exists(TRANSACTIONS_FILE):
             try:
-                with open(TRANSACTIONS_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.transactions = data.get('transactions', [])
+                with ledger_lock():
+                    with open(TRANSACTIONS_FILE, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                        records = data.get('transactions', [])
+                        self._store_sequence = data.get('sequence', 0)
+                        if 'periods' in data: # 舊檔案沒有校驗資料
+                            self._integrity_problems += verify_periods(records, data['periods'],
+                                                                       data.get('opening_balance_cents', 0), TRANSACTIONS_FILE)
 
-                    today_str = dt.datetime.now().strftime(self.DATE_FORMAT)
+                        # 舊檔案沒有 id 欄位 (或手動改成非整數)，載入時補上並建立備註索引
+                        self._next_record_id = max(self._next_record_id,
+                                                   max((r['id'] for r in records if isinstance(r.get('id'), int)), default=0) + 1)
 
-                    for record in self.transactions:
-                        if 'date' not in record:
-                            record['date'] = today_str
+                        for record in records:
+                            self._ingest_record(record)
 
-                        # 確保金額是浮點數
-                        record['amount'] = float(record.get('amount', 0.0))
-                        record['new_balance'] = float(record.get('new_balance', 0.0))
+                    self._apply_journal()
+                    self._synced['hot'] = {r['id']: self.fingerprint(r) for r in self.transactions}
 
             except Exception as e:
-                messagebox.showerror("載入錯誤", f"無法讀取檔案 {TRANSACTIONS_FILE}: {e}", parent=self.master)
+                self.report_error("載入錯誤", f"無法讀取檔案 {TRANSACTIONS_FILE}: {e}")
                 self.transactions = []
+                self.records_by_id.clear()
+                self.description_index = DescriptionIndex()
+                self.money = MoneyColumns()
+                self.month_spending.clear()
+                self._synced.clear()
+
+        # 熱分區中過去年度的記錄 (例如跨年後第一次開啟，或舊版的單一檔案) 存檔時要移入封存；
+        # 先載入這些年度之後的封存，讓記憶體中的記錄在時間上保持連續
+        stale_years = {self.record_year(r) for r in self.transactions if self.record_year(r) < self.hot_year()}
+        if stale_years:
+            self._dirty_years |= stale_years
+            self.load_archive_from(min(stale_years))
+        self._update_base_balance()
+        self._store_stat = self._store_signature()
+        self.report_integrity_problems()
+
+    def _ingest_record(self, record: Dict[str, Any], from_archive: bool = False):
+        """整理一筆從檔案讀入的記錄，並加入帳本、索引與金額欄位。"""
+        if from_archive and record.get('id') in self.records_by_id:
+            return # 熱分區中已有較新的同一筆記錄 (上次存檔中斷)
+
+        if 'date' not in record:
+            record['date'] = dt.datetime.now().strftime(self.DATE_FORMAT)
+        else:
+            try:
+                record['date'] = self.normalize_date(record['date']) # 舊版直接儲存輸入的日期 (可能未補零)
+            except ValueError:
+                pass
+        record.setdefault('description', '')
+
+        # 金額移到整數分欄位 (舊檔案以浮點數 amount 儲存)；餘額稍後重算
+        if 'amount_cents' in record:
+            amount_cents = check_cents(int(record.pop('amount_cents')))
+        else:
+            amount_cents = to_cents(record.get('amount', 0))
+        for key in ('amount', 'new_balance', 'balance_cents'):
+            record.pop(key, None)
+
+        self._register_record(record)
+        self.money.set_amount(record['id'], amount_cents, record['type'] == '支出')
+        self._track_spending(record, 1)
+        self.transactions.append(record)
+
+    # --------------------------------------------------------------------
+    # --- 年度分區與封存 ---
+    # --------------------------------------------------------------------
+
+    @staticmethod
+    def hot_year() -> int:
+        """熱分區的年度 (今年)；更早的年度視為已結算，存檔時移入封存。"""
+        return dt.date.today().year
+
+    @staticmethod
+    def record_year(record: Dict[str, Any]) -> int:
+        return int(record['date'][:4])
+
+    def archived_years(self) -> List[int]:
+        return sorted(int(y) for y in self.archive_manifest['years'])
+
+    def unloaded_archive_years(self) -> List[int]:
+        return [y for y in self.archived_years() if y not in self._loaded_archive_years]
+
+    def _update_base_balance(self):
+        """已載入的記錄一定比未載入的封存年度晚，因此起始餘額就是最後一個未載入年度的期末餘額。"""
+        unloaded = self.unloaded_archive_years()
+        self._base_balance = self.archive_manifest['years'][str(unloaded[-1])]['closing_balance_cents'] if unloaded else 0
+
+    def load_archive_from(self, year: int) -> bool:
+        """
+        載入 year (含) 之後所有尚未載入的封存年度，回傳是否有載入新的資料。
+        由新到舊依序載入，讓記憶體中的記錄永遠是連續的一段時間 (餘額才能從期末餘額接續計算)。
+        呼叫端需在載入後重新排序並計算餘額，並在釋放 ledger_lock 後呼叫 report_integrity_problems。
+        """
+        years = [y for y in self.unloaded_archive_years() if y >= year]
+        if not years:
+            return False
+
+        for y in sorted(years, reverse=True):
+            try:
+                with gzip.open(archive_segment_path(y), 'rt', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception as e:
+                self.report_error("載入錯誤", f"無法讀取 {y} 年的封存檔: {e}")
+                break
+            if data.get('periods'):
+                label = f"{y} 年封存"
+                self._integrity_problems += verify_periods(data['transactions'], data['periods'],
+                                                           data.get('opening_balance_cents', 0), label)
+                meta = self.archive_manifest['years'].get(str(y))
+                closing = data['periods'][-1]['closing_balance_cents']
+                if meta is not None and meta['closing_balance_cents'] != closing:
+                    self._integrity_problems.append(f"{label}: 期末餘額 {format_cents(closing)} 與封存索引記錄的 "
+                                                    f"{format_cents(meta['closing_balance_cents'])} 不符")
+            fingerprints = {}
+            for record in data.get('transactions', []):
+                if isinstance(record.get('id'), int):
+                    fingerprints[record['id']] = stored_fingerprint(record)
+                self._ingest_record(record, from_archive=True)
+            self._synced[str(y)] = fingerprints
+            self._loaded_archive_years.add(y)
+
+        self._update_base_balance()
+        return True
+
+    def report_error(self, title: str, message: str):
+        """回報載入/存檔錯誤：無視窗 (只執行本機 API) 時印出，否則顯示對話框。"""
+        if self.master is None:
+            print(f"ERROR: {title}: {message}")
+            return
+        messagebox.showerror(title, message, parent=self.master)
+
+    def report_integrity_problems(self):
+        """回報載入時校驗發現的問題 (餘額仍會依金額重新計算，但使用者需要知道哪裡被改過)。"""
+        if not self._integrity_problems:
+            return
+        problems, self._integrity_problems = self._integrity_problems, []
+        lines = problems[:INTEGRITY_REPORT_LIMIT]
+        if len(problems) > len(lines):
+            lines.append(f"…… 另有 {len(problems) - len(lines)} 項")
+        if self.master is None:
+            print("WARNING: 資料完整性校驗失敗:\n" + "\n".join(lines))
+            return
+        messagebox.showwarning("資料完整性警告",
+                               "交易檔與存檔時的校驗資料不符，可能被手動修改或寫入不完整：\n\n" + "\n".join(lines),
+                               parent=self.master)
+
+    def ensure_history_loaded(self, date_str: str) -> bool:
+        """查詢或新增的日期落在未載入的封存年度時，先載入封存並重算餘額。回傳是否有載入新資料。"""
+        if not self.load_archive_from(int(date_str[:4])):
+            return False
+        self.report_integrity_problems()
+        self._ledger_changed()
+        self._recompute_all_balances()
+        self.update_balance_display()
+        return True
+
+    def load_history_for_chart(self, year: int, xlim):
+        """折線圖縮放到未載入的封存年度時呼叫：載入後重繪，並還原使用者的顯示範圍。"""
+        self._history_load_pending = False
+        if self.load_archive_from(year):
+            self.report_integrity_problems()
+            self._ledger_changed()
+            self._pending_trend_xlim = xlim
+            self.recalculate_balance()
+
+    def _mark_dirty(self, record: Dict[str, Any]):
+        self._dirty_years.add(self.record_year(record))
+
+    def _period_summary(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """一個年度 (已按日期排序) 的期初/期末餘額與月、類別彙總，存入封存索引。"""
+        monthly: Dict[str, Dict[str, int]] = defaultdict(lambda: {'收入': 0, '支出': 0})
+        category_expense: Dict[str, int] = defaultdict(int)
+        for r in records:
+            amount = self.amount_cents(r)
+            if r['type'] in ('收入', '支出'):
+                monthly[r['date'][:7]][r['type']] += amount
+            if r['type'] == '支出':
+                category_expense[r['category']] += amount
+        return {
+            'count': len(records),
+            'opening_balance_cents': self.balance_cents(records[0]) - self.money.signed_of(records[0]['id']),
+            'closing_balance_cents': self.balance_cents(records[-1]),
+            'monthly': dict(monthly),
+            'category_expense': dict(category_expense),
+        }
+
+    def _save_archive(self, records_by_year: Dict[int, List[Dict[str, Any]]]):
+        """重寫有變動的封存分段檔，並更新封存索引 (已載入年度的餘額與彙總)。"""
+        years_meta = self.archive_manifest['years']
+        if records_by_year:
+            os.makedirs(ARCHIVE_DIR, exist_ok=True)
+
+        for y, records in records_by_year.items():
+            summary = self._period_summary(records)
+            # 較早年度的變動會改變之後年度的餘額，彙總不同時分段檔也要重寫，兩者才會一致
+            if y in self._dirty_years or years_meta.get(str(y)) != summary:
+                write_json_atomic(archive_segment_path(y), dict(self._storage_payload(records), year=y), compress=True)
+            years_meta[str(y)] = summary
+
+        # 已載入的封存年度若所有記錄都被刪除，移除其分段檔
+        for y in self._loaded_archive_years - set(records_by_year):
+            years_meta.pop(str(y), None)
+            if os.path.exists(archive_segment_path(y)):
+                os.remove(archive_segment_path(y))
+
+        self._loaded_archive_years = set(records_by_year) # 記憶體中的過去年度現在都已封存
+        self.archive_manifest['next_id'] = self._next_record_id
+        if years_meta or os.path.exists(ARCHIVE_MANIFEST):
+            write_json_atomic(ARCHIVE_MANIFEST, self.archive_manifest)
+
+    def _register_record(self, record: Dict[str, Any]):
+        """為交易指派 id (若尚未有)，並加入 id 對照表與備註索引。"""
+        if not isinstance(record.get('id'), int) or record['id'] in self.records_by_id:
+            record['id'] = self._next_record_id
+        self._next_record_id = max(self._next_record_id, record['id'] + 1)
+        self.records_by_id[record['id']] = record
+        self.description_index.add(record['id'], record['description'])
+
+    def _unregister_record(self, record: Dict[str, Any]):
+        """從 id 對照表、備註索引、金額欄位與支出累計中移除交易。"""
+        self._track_spending(record, -1)
+        self.records_by_id.pop(record['id'], None)
+        self.description_index.remove(record['id'])
+        self.money.clear(record['id'])
+
+    def amount_cents(self, record: Dict[str, Any]) -> int:
+        if 'rule_id' in record: # 週期交易的一次發生，金額在記錄中
+            return record['amount_cents']
+        return self.money.amount(record['id'])
+
+    def signed_cents(self, record: Dict[str, Any]) -> int:
+        if 'rule_id' in record:
+            return -record['amount_cents'] if record['type'] == '支出' else record['amount_cents']
+        return self.money.signed_of(record['id'])
+
+    def balance_cents(self, record: Dict[str, Any]) -> int:
+        return self.money.balance_of(record['id'])
+
+    def fingerprint(self, record: Dict[str, Any]) -> tuple:
+        """記憶體中一筆記錄的內容摘要 (與 stored_fingerprint 相同格式)。"""
+        return (record['date'], record['type'], record['category'], record['description'], self.amount_cents(record))
+
+    def _apply_fields(self, record: Dict[str, Any], fields: Dict[str, Any]):
+        """更新記錄欄位，並同步備註索引與金額欄位 (不處理餘額)。"""
+        fields = dict(fields)
+        if 'amount' in fields: # 舊版日誌以浮點數記錄金額
+            fields['amount_cents'] = to_cents(fields.pop('amount'))
+        amount_cents = fields.pop('amount_cents', self.amount_cents(record))
+
+        self._track_spending(record, -1)
+        self.description_index.remove(record['id'])
+        record.update(fields)
+        self.description_index.add(record['id'], record['description'])
+        self.money.set_amount(record['id'], amount_cents, record['type'] == '支出')
+        self._track_spending(record, 1)
+
+    def _track_spending(self, record: Dict[str, Any], sign: int):
+        """把一筆支出加入 (sign=1) 或移出 (sign=-1) 所屬月份與類別的累計。"""
+        if record['type'] == '支出':
+            self.month_spending[(record['date'][:7], record['category'])] += sign * self.amount_cents(record)
+
+    def _apply_journal(self) -> bool:
+        """
+        套用日誌中 self._journal_offset 之後的編輯 (啟動時從頭開始，之後只讀新增的行)，
+        回傳是否有套用任何編輯。餘額由呼叫端重算。
+        """
+        if not os.path.exists(JOURNAL_FILE):
+            self._journal_offset = 0
+            return False
+        if os.path.getsize(JOURNAL_FILE) < self._journal_offset:
+            self._journal_offset = 0 # 日誌已被其他程式清空後重新寫入
+
+        applied = False
+        hot_synced = self._synced.get('hot', {})
+        with open(JOURNAL_FILE, 'rb') as f:
+            f.seek(self._journal_offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break # 寫入中斷或正在寫入的不完整行，略過
+                self._journal_offset += len(raw)
+                try:
+                    entry = json.loads(raw.decode('utf-8'))
+                except ValueError:
+                    continue
+                record = self.records_by_id.get(entry.get('id'))
+                if entry.get('op') != 'edit' or record is None:
+                    continue
+                self._mark_dirty(record)
+                self._apply_fields(record, entry['fields'])
+                self._mark_dirty(record)
+                self._journal_entries += 1
+                if record['id'] in hot_synced:
+                    hot_synced[record['id']] = self.fingerprint(record)
+                applied = True
+        return applied
+
+    def append_journal(self, entry: Dict[str, Any]):
+        """把單筆變更附加到日誌檔，不必重寫整個交易檔；日誌過長時改為完整存檔。"""
+        if self._journal_entries >= JOURNAL_COMPACT_LIMIT:
+            self.save_transactions()
+            return
+        try:
+            with self.locked_store():
+                external = self._sync_from_store()
+                record = self.records_by_id.get(entry['id'])
+                if external and record is not None:
+                    # 其他程式的變更已併入，重新套用本次修改，讓記憶體與日誌的順序一致
+                    self._apply_fields(record, entry['fields'])
+                    self._recompute_all_balances()
+
+                with open(JOURNAL_FILE, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._journal_offset = os.path.getsize(JOURNAL_FILE)
+                self._journal_entries += 1
+                if record is not None and record['id'] in self._synced.get('hot', {}):
+                    self._synced['hot'][record['id']] = self.fingerprint(record)
+                self._store_stat = self._store_signature()
+            if external:
+                self.refresh_current_view()
+        except Exception as e:
+            self.report_error("存檔錯誤", f"無法寫入日誌 {JOURNAL_FILE}: {e}")
+
+    # --------------------------------------------------------------------
+    # --- 多程式同步 (檔案鎖、變更偵測與增量合併) ---
+    # --------------------------------------------------------------------
+
+    @contextmanager
+    def locked_store(self):
+        """
+        取得 ledger_lock 讀寫帳本檔案。鎖內合併時載入封存發現的校驗問題，等鎖釋放後才回報，
+        警告對話框才不會讓其他程式一直等在檔案鎖上。
+        """
+        try:
+            with ledger_lock():
+                yield
+        finally:
+            self.report_integrity_problems()
+
+    @staticmethod
+    def _store_signature():
+        return (file_signature(TRANSACTIONS_FILE), file_signature(JOURNAL_FILE), file_signature(ARCHIVE_MANIFEST),
+                file_signature(RECURRING_FILE), file_signature(BUDGETS_FILE))
+
+    def sync_external_changes(self) -> bool:
+        """檢查交易檔、日誌、封存索引、週期規則與預算檔的修改時間/大小；有變動才取得鎖並增量合併。回傳是否有變動。"""
+        if self._store_signature() == self._store_stat:
+            return False
+        with self.locked_store():
+            return self._sync_from_store()
+
+    def check_external_changes(self):
+        """定時同步其他程式對帳本的修改。"""
+        try:
+            if self.sync_external_changes():
+                self.refresh_current_view()
+        except Exception as e:
+            print(f"ERROR: 無法同步交易檔: {e}")
+        self.master.after(SYNC_INTERVAL_MS, self.check_external_changes)
+
+    def _sync_from_store(self) -> bool:
+        """
+        (呼叫端需持有 ledger_lock) 將其他程式寫入的變更併入記憶體，回傳是否有變動。
+        只新增、刪除或修改有差異的記錄，其餘記錄與索引保持不動。
+        """
+        signature = self._store_signature()
+        if signature == self._store_stat:
+            return False
+        old_hot, old_journal, old_manifest, old_recurring, old_budgets = self._store_stat or (None,) * 5
+        hot_sig, journal_sig, manifest_sig, recurring_sig, budgets_sig = signature
+        changed = False
+        removals: List[tuple] = [] # 各分區都合併後才刪除 (記錄可能只是移到另一個年度)
+
+        if hot_sig != old_hot and hot_sig is not None:
+            with open(TRANSACTIONS_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            changed |= self._merge_store_records(data.get('transactions', []), 'hot', removals)
+            sequence = data.get('sequence', 0)
+            if sequence != self._store_sequence:
+                # 其他程式做過完整存檔 (會清空日誌)，之後的日誌行都是新的
+                self._store_sequence = sequence
+                self._journal_offset = 0
+                self._journal_entries = 0
+
+        if journal_sig != old_journal or hot_sig != old_hot:
+            changed |= self._apply_journal()
+
+        if manifest_sig != old_manifest:
+            changed |= self._sync_archive(removals)
+        changed |= self._apply_removals(removals)
+
+        if recurring_sig != old_recurring:
+            changed |= self._sync_recurring()
+        if budgets_sig != old_budgets:
+            changed |= self._sync_budgets()
+
+        if changed:
+            self._ledger_changed()
+            self._recompute_all_balances()
+        self._store_stat = self._store_signature()
+        return changed
+
+    def _sync_archive(self, removals: List[tuple]) -> bool:
+        """封存索引被其他程式更新：重新讀取索引，並合併已載入且內容有變的年度。"""
+        old_years = self.archive_manifest['years']
+        self.archive_manifest = load_archive_manifest()
+        self._next_record_id = max(self._next_record_id, self.archive_manifest.get('next_id', 1))
+        changed = False
+
+        for y in sorted(self._loaded_archive_years):
+            if self.archive_manifest['years'].get(str(y)) == old_years.get(str(y)):
+                continue
+            stored_records = []
+            if os.path.exists(archive_segment_path(y)):
+                with gzip.open(archive_segment_path(y), 'rt', encoding='utf-8') as f:
+                    stored_records = json.load(f).get('transactions', [])
+            changed |= self._merge_store_records(stored_records, str(y), removals)
+        # 先刪除真正被刪除的記錄，移入新封存年度的記錄才會從分段檔重新載入
+        changed |= self._apply_removals(removals)
+
+        # 新封存的年度若比已載入的年度晚，必須一併載入，記憶體中的記錄才會連續
+        if self._loaded_archive_years:
+            changed |= self.load_archive_from(min(self._loaded_archive_years))
+
+        old_base = self._base_balance
+        self._update_base_balance()
+        return changed or self._base_balance != old_base
+
+    def _sync_recurring(self) -> bool:
+        """週期規則檔被其他程式更新：與本地規則三方合併。"""
+        stored = RecurringRules.load()
+        base = stored.snapshot()
+        changed = self.recurring.merge(stored, self._synced_rules)
+        self._synced_rules = base
+        return changed
+
+    def _sync_budgets(self) -> bool:
+        """預算檔被其他程式更新：與本地預算三方合併。"""
+        stored = load_budgets()
+        changed = merge_settings(self.budgets, stored, self._synced_budgets)
+        self._synced_budgets = stored
+        return changed
+
+    def _merge_store_records(self, stored_records: List[Dict[str, Any]], source: str, removals: List[tuple]) -> bool:
+        """
+        以 id 三方比對檔案內容、記憶體與上次同步時的摘要 (self._synced[source])：
+        - 檔案中新出現、但曾在其他分區同步過的 id：其他程式把記錄移到別的年度，視為修改並改記在這個分區
+        - 檔案中新出現且從未同步過的 id：其他程式新增，加入帳本 (與本地尚未存檔的新記錄 id 衝突時，本地記錄改用新 id)
+        - 摘要改變且本地未修改：其他程式修改，套用檔案內容 (本地也改過時保留本地版本，存檔時寫回)
+        - 上次同步有、檔案中已不存在：加入 removals，所有分區合併完後仍未在別處出現才從帳本移除
+        有變動的記錄所屬年度都標記為需重寫，存檔時分段檔才會與封存索引一致。
+        """
+        synced = self._synced.setdefault(source, {})
+        stored_by_id: Dict[int, Dict[str, Any]] = {}
+        changed = False
+
+        for stored in stored_records:
+            if isinstance(stored.get('id'), int):
+                stored_by_id[stored['id']] = stored
+            else:
+                self._ingest_record(stored) # 外部腳本寫入的記錄沒有 id，視為新增
+                changed = True
+        if stored_by_id:
+            self._next_record_id = max(self._next_record_id, max(stored_by_id) + 1)
+
+        for record_id, stored in stored_by_id.items():
+            fingerprint = stored_fingerprint(stored)
+            base = synced.get(record_id)
+            if base is None:
+                # 曾在其他分區同步過：只是換了年度，改記在這個分區 (不會再被原分區刪除)
+                base = next((other.pop(record_id) for other in self._synced.values()
+                             if other is not synced and record_id in other), None)
+            record = self.records_by_id.get(record_id)
+            if base is None:
+                if record is not None:
+                    self._reassign_id(record)
+                self._ingest_record(stored)
+                self._mark_dirty(stored)
+                changed = True
+            elif fingerprint != base and record is not None and self.fingerprint(record) == base:
+                fields = {k: stored[k] for k in ('date', 'type', 'category', 'description') if k in stored}
+                fields['amount_cents'] = fingerprint[4]
+                self._mark_dirty(record)
+                self._apply_fields(record, fields)
+                self._mark_dirty(record)
+                changed = True
+            synced[record_id] = fingerprint
+
+        removals.extend((source, i) for i in synced if i not in stored_by_id)
+        return changed
+
+    def _apply_removals(self, removals: List[tuple]) -> bool:
+        """刪除合併後仍只屬於原分區、但檔案中已不存在的記錄 (其他程式刪除)，回傳是否有刪除。"""
+        removed = set()
+        for source, record_id in removals:
+            synced = self._synced.get(source, {})
+            if record_id not in synced:
+                continue # 已在其他分區出現 (記錄被移到別的年度)
+            del synced[record_id]
+            record = self.records_by_id.get(record_id)
+            if record is not None:
+                self._mark_dirty(record)
+                self._unregister_record(record)
+                removed.add(record_id)
+        removals.clear()
+        if removed:
+            self.transactions[:] = [r for r in self.transactions if r['id'] not in removed]
+        return bool(removed)
+
+    def _reassign_id(self, record: Dict[str, Any]):
+        """本地尚未存檔的新記錄與其他程式新增的記錄 id 相同時，改派一個新的 id。"""
+        amount_cents = self.amount_cents(record)
+        self._unregister_record(record)
+        record['id'] = self._next_record_id
+        self._register_record(record)
+        self.money.set_amount(record['id'], amount_cents, record['type'] == '支出')
+        self._track_spending(record, 1)
+
+    def refresh_current_view(self):
+        """帳本在表單以外變動後 (其他程式、API、週期規則)，更新餘額顯示並重新整理目前的檢視。"""
+        if self.master is None:
+            return
+        self.update_balance_display()
+        if self._viewing_all or self._current_criteria is None:
+            self._current_view_entry = self._all_view_entry()
+            self.update_transaction_list(self.all_view_records())
+        else:
+            self.update_transaction_list(self.query_view(self._current_criteria))
+        self.update_chart_if_active()
+        self.update_budget_panel()
+
+    def _storage_payload(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """存檔內容：記錄 (已按日期排序)、期初餘額與每月校驗資料。"""
+        opening = self.balance_cents(records[0]) - self.money.signed_of(records[0]['id']) if records else self._base_balance
+        stored = [self._record_for_storage(r) for r in records]
+        return {'opening_balance_cents': opening, 'periods': period_checksums(stored, opening), 'transactions': stored}
+
+    def _record_for_storage(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """存檔用的記錄：金額與餘額以整數分儲存。"""
+        stored = dict(record)
+        stored['amount_cents'] = self.amount_cents(record)
+        stored['balance_cents'] = self.balance_cents(record)
+        return stored
 
     def save_transactions(self):
-        data_to_save = {'transactions': self.transactions}
+        """存檔：過去年度寫入封存 (只重寫有變動的年度)，今年的交易寫入 TRANSACTIONS_FILE。"""
+        hot_year = self.hot_year()
+        hot_records: List[Dict[str, Any]] = []
+        records_by_year: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        for r in self.transactions:
+            year = self.record_year(r)
+            if year >= hot_year:
+                hot_records.append(r)
+            else:
+                records_by_year[year].append(r)
+
         try:
-            with open(TRANSACTIONS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(data_to_save, f, ensure_ascii=False, indent=4)
+            with self.locked_store():
+                # 先併入其他程式的變更，避免用記憶體中的舊內容覆蓋掉它們
+                external = self._sync_from_store()
+                if external:
+                    hot_records = [r for r in self.transactions if self.record_year(r) >= hot_year]
+                    records_by_year = defaultdict(list)
+                    for r in self.transactions:
+                        if self.record_year(r) < hot_year:
+                            records_by_year[self.record_year(r)].append(r)
+
+                # 先寫封存再寫熱分區：中途中斷時，熱分區仍保有完整記錄
+                self._save_archive(records_by_year)
+                self._dirty_years.clear()
+                self._store_sequence += 1
+                write_json_atomic(TRANSACTIONS_FILE, dict(self._storage_payload(hot_records), sequence=self._store_sequence))
+                # 完整存檔已包含所有編輯，日誌可以清空
+                if os.path.exists(JOURNAL_FILE):
+                    os.remove(JOURNAL_FILE)
+                self._journal_entries = 0
+                self._journal_offset = 0
+
+                # 檔案內容現在與記憶體一致
+                self._synced = {'hot': {r['id']: self.fingerprint(r) for r in hot_records}}
+                for y, records in records_by_year.items():
+                    self._synced[str(y)] = {r['id']: self.fingerprint(r) for r in records}
+                self._store_stat = self._store_signature()
+
+            if external:
+                self.refresh_current_view()
         except Exception as e:
+            if self.master is None:
+                raise # 無視窗時交給呼叫端 (API 會回報錯誤給用戶端)
             messagebox.showerror("存檔錯誤", f"無法儲存檔案 {TRANSACTIONS_FILE}: {e}", parent=self.master)
 
     def on_closing(self):
@@ -506,9 +2039,12 @@ class ExpenseTrackerApp:
             self.master.destroy()
 
     def update_balance_display(self):
+        if self.master is None:
+            return
         PRIMARY_COLOR = '#000093'
-        self.balance_var.set(f"{self.balance:,.2f} 元") # 使用逗號分隔金額
-        if self.balance >= 0:
+        balance = self.current_balance()
+        self.balance_var.set(f"{format_cents(balance)} 元") # 使用逗號分隔金額
+        if balance >= 0:
             self.balance_label.config(fg=PRIMARY_COLOR)
         else:
             self.balance_label.config(fg="red")
@@ -555,7 +2091,7 @@ class ExpenseTrackerApp:
             
             if is_numeric:
                 try:
-                    return float(val) # 金額和餘額按數字排序
+                    return float(val.replace(',', '')) # 金額和餘額按數字排序 (去除千分位逗號)
                 except ValueError:
                     return 0.0 # 處理無效數字
             
@@ -585,55 +2121,293 @@ class ExpenseTrackerApp:
         # 更新欄位標題以顯示排序箭頭 (▲ 升序, ▼ 降序)
         self._update_heading_arrows(col, reverse)
 
-    def update_transaction_list(self, display_list: List[Dict[str, Any]]):
-        """清空表格並重新載入指定的交易紀錄（保持 iid 與 self.transactions 對應）"""
+    def update_transaction_list(self, display_list: List[Dict[str, Any]], on_done=None):
+        """
+        清空表格並重新載入指定的交易紀錄（iid 為交易的 id）。
+        記錄較多時分批插入 (每批 TABLE_STREAM_CHUNK 筆)，讓視窗在載入期間仍可操作；
+        on_done 會在所有記錄插入完成後呼叫。
+        """
 
         self.tree.delete(*self.tree.get_children())
         self.current_filtered_transactions = display_list
+        self._stream_generation += 1
 
         if not display_list:
             self.tree.insert("", tk.END, values=("--", "無", "記錄", "可", "顯示", "--"))
+            if on_done:
+                on_done()
             return
 
-        # 依日期（新到舊）排序顯示，但 iid 必須是原始索引
+        # 依日期（新到舊）排序顯示，iid 使用交易 id
         sorted_records = sorted(
-        ((i, r) for i, r in enumerate(self.transactions) if r in display_list),
-        key=lambda x: dt.datetime.strptime(x[1]['date'], self.DATE_FORMAT),
+        display_list,
+        key=lambda r: dt.datetime.strptime(r['date'], self.DATE_FORMAT),
         reverse=True
         )
 
-        for index, record in sorted_records:
-            tag = 'income_tag' if record['type'] == '收入' else 'expense_tag'
-            self.tree.insert(
-                "",
-                tk.END,
-                iid=index,
-                values=(
-                    record['date'],
-                    record['type'],
-                    f"{record['amount']:,.2f}",
-                    record['category'],
-                    record['description'],
-                    f"{record['new_balance']:,.2f}"
-                ),
-                tags=(tag,)
-            )
+        if on_done is None and len(sorted_records) <= TABLE_STREAM_CHUNK:
+            for record in sorted_records:
+                self._insert_tree_row(record)
+            return
+
+        self._stream_rows(sorted_records, 0, self._stream_generation, on_done)
+
+    def _stream_rows(self, sorted_records: List[Dict[str, Any]], start: int, generation: int, on_done):
+        """插入一批記錄後把下一批排入事件迴圈；表格已被新的更新取代時就停止。"""
+        if generation != self._stream_generation:
+            return
+
+        for record in sorted_records[start:start + TABLE_STREAM_CHUNK]:
+            self._insert_tree_row(record)
+
+        next_start = start + TABLE_STREAM_CHUNK
+        if next_start < len(sorted_records):
+            self.master.after(1, self._stream_rows, sorted_records, next_start, generation, on_done)
+        elif on_done:
+            on_done()
+
+    def _row_values(self, record: Dict[str, Any]):
+        return (
+            record['date'],
+            record['type'],
+            format_cents(self.amount_cents(record)),
+            record['category'],
+            f"🔁 {record['description']}" if 'rule_id' in record else record['description'],
+            format_cents(self.display_balance_cents(record))
+        )
+
+    def _insert_tree_row(self, record: Dict[str, Any]):
+        tag = 'income_tag' if record['type'] == '收入' else 'expense_tag'
+        self.tree.insert(
+            "",
+            tk.END,
+            iid=record['id'],
+            values=self._row_values(record),
+            tags=(tag,)
+        )
 
     def recalculate_balance(self):
         """重新計算總餘額，並更新顯示所有交易記錄"""
-        self.transactions.sort(key=lambda x: dt.datetime.strptime(x['date'], self.DATE_FORMAT)) # 按日期排序
-
-        self.balance = 0.0
-        for record in self.transactions:
-            transaction_amount = record['amount']
-            if record['type'] == '支出':
-                transaction_amount = -transaction_amount
-            self.balance += transaction_amount
-            record['new_balance'] = self.balance # 更新每筆交易後的餘額
+        self._recompute_all_balances()
+        self.show_all_transactions()
 
+    def show_all_transactions(self):
+        """(餘額已重算) 更新餘額顯示並切換到「顯示全部記錄」檢視。"""
+        self._last_filter = None # 上一次的篩選結果已過期
         self.update_balance_display()
-        self.update_transaction_list(self.transactions) # 顯示所有記錄，同時更新 current_filtered_transactions
+        self._viewing_all = True
+        self._current_view_entry = self._all_view_entry()
+        self.update_transaction_list(self.all_view_records()) # 顯示所有記錄，同時更新 current_filtered_transactions
         self.update_chart_if_active() # 重設餘額時，更新圖表到所有記錄的狀態
+        self.update_budget_panel()
+
+    def _recompute_all_balances(self):
+        """按日期排序，並從未載入封存的期末餘額開始以整數分累加每筆交易後的餘額。"""
+        self.transactions.sort(key=lambda x: dt.datetime.strptime(x['date'], self.DATE_FORMAT)) # 按日期排序
+        self.balance = self.money.recompute([r['id'] for r in self.transactions], self._base_balance)
+
+    def _ledger_changed(self):
+        """帳本已變動：快取的查詢結果、目前檢視的彙總與上一次的篩選結果都失效。"""
+        self.query_cache.invalidate()
+        self._current_view_entry = None
+        self._last_filter = None
+
+    def _date_lower_bound(self, date_str: str) -> int:
+        """self.transactions (按日期排序) 中第一筆日期不早於 date_str 的位置。"""
+        lo, hi = 0, len(self.transactions)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.transactions[mid]['date'] < date_str:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _record_position(self, record: Dict[str, Any]) -> int:
+        """找出記錄在 self.transactions (按日期排序) 中的位置：先以二分搜尋定位日期，再比對物件。"""
+        for i in range(self._date_lower_bound(record['date']), len(self.transactions)):
+            if self.transactions[i] is record:
+                return i
+        raise ValueError("記錄不在帳本中")
+
+    def _insertion_position(self, date_str: str) -> int:
+        """新日期的插入位置 (排在同日期記錄之後，與 append 後排序的結果一致)。"""
+        lo, hi = 0, len(self.transactions)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.transactions[mid]['date'] <= date_str:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def apply_edit(self, record: Dict[str, Any], changes: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        就地修改一筆交易，只更新受影響的餘額，回傳餘額或內容有變動的記錄。
+        只改金額/類型時，把差額加到其後每筆記錄的餘額；
+        改日期時才把記錄移到新位置，並重算新舊位置之間 (金額也變時則到結尾) 的餘額。
+        餘額會超出 int64 時還原修改並拋出 ValueError。
+        """
+        old_date = record['date']
+        old_signed = self.money.signed_of(record['id'])
+        old_fields = {k: record[k] for k in ('date', 'type', 'category', 'description')}
+        old_fields['amount_cents'] = self.amount_cents(record)
+        pos = self._record_position(record)
+
+        self._apply_fields(record, changes)
+
+        delta = self.money.signed_of(record['id']) - old_signed
+
+        if record['date'] == old_date:
+            if not delta:
+                return [record]
+            affected = self.transactions[pos:]
+            try:
+                self.money.shift([r['id'] for r in affected], delta)
+            except ValueError:
+                self._apply_fields(record, old_fields)
+                raise
+            self.balance += delta
+            return affected
+
+        # 日期變動：移到新位置，從較早的位置開始重算餘額
+        del self.transactions[pos]
+        new_pos = self._insertion_position(record['date'])
+        self.transactions.insert(new_pos, record)
+
+        start = min(pos, new_pos)
+        stop = len(self.transactions) if delta else max(pos, new_pos) + 1
+        start_balance = self.balance_cents(self.transactions[start - 1]) if start > 0 else self._base_balance
+        try:
+            self.money.recompute([r['id'] for r in self.transactions[start:stop]], start_balance)
+        except ValueError:
+            del self.transactions[new_pos]
+            self.transactions.insert(pos, record)
+            self._apply_fields(record, old_fields)
+            raise
+        if delta:
+            self.balance += delta
+        return self.transactions[start:stop]
+
+    @staticmethod
+    def clicked_row(tree: ttk.Treeview, event=None) -> str:
+        """雙擊所在資料列的 iid；點在欄位標題或列下方空白處時回傳空字串。沒有事件時取目前的焦點列。"""
+        if event is None:
+            return tree.focus()
+        if tree.identify_region(event.x, event.y) != 'cell':
+            return ''
+        return tree.identify_row(event.y)
+
+    def show_edit_dialog(self, event=None):
+        """開啟編輯視窗 (雙擊表格記錄)，欄位預先填入目前的內容。"""
+        iid = self.clicked_row(self.tree, event)
+        if not iid:
+            return # 雙擊標題 (例如切換排序方向) 或空白處
+        record = self.record_for_iid(iid)
+        if record is None:
+            return
+
+        edit_window = tk.Toplevel(self.master)
+        edit_window.title("✏️ 編輯交易")
+        edit_window.configure(bg='#F0F8FF')
+        edit_window.resizable(False, False)
+        edit_window.transient(self.master)
+        edit_window.grab_set()
+
+        edit_frame = tk.Frame(edit_window, bg='#F0F8FF', padx=20, pady=10)
+        edit_frame.pack(expand=True)
+
+        tk.Label(edit_frame, text="日期:", bg='#F0F8FF').grid(row=0, column=0, padx=5, pady=5, sticky='w')
+        date_var = tk.StringVar(value=record['date'])
+        ttk.Entry(edit_frame, textvariable=date_var, width=20).grid(row=0, column=1, padx=5, pady=5, sticky='we')
+
+        tk.Label(edit_frame, text="類型:", bg='#F0F8FF').grid(row=1, column=0, padx=5, pady=5, sticky='w')
+        type_var = tk.StringVar(value=record['type'])
+        ttk.Combobox(edit_frame, textvariable=type_var, values=["支出", "收入"], state="readonly", width=15).grid(row=1, column=1, padx=5, pady=5, sticky='we')
+
+        tk.Label(edit_frame, text="金額:", bg='#F0F8FF').grid(row=2, column=0, padx=5, pady=5, sticky='w')
+        amount_var = tk.StringVar(value=format_cents(self.amount_cents(record), grouping=False))
+        ttk.Entry(edit_frame, textvariable=amount_var, width=20).grid(row=2, column=1, padx=5, pady=5, sticky='we')
+
+        tk.Label(edit_frame, text="類別:", bg='#F0F8FF').grid(row=3, column=0, padx=5, pady=5, sticky='w')
+        category_var = tk.StringVar(value=record['category'])
+        ttk.Combobox(edit_frame, textvariable=category_var, values=self.categories, state="readonly", width=15).grid(row=3, column=1, padx=5, pady=5, sticky='we')
+
+        tk.Label(edit_frame, text="備註:", bg='#F0F8FF').grid(row=4, column=0, padx=5, pady=5, sticky='w')
+        description_var = tk.StringVar(value=record['description'])
+        ttk.Entry(edit_frame, textvariable=description_var, width=20).grid(row=4, column=1, padx=5, pady=5, sticky='we')
+
+        def submit():
+            self.edit_transaction(record, edit_window, {
+                "date": date_var.get().strip(),
+                "type": type_var.get(),
+                "amount": amount_var.get().strip(),
+                "category": category_var.get(),
+                "description": description_var.get().strip(),
+            })
+
+        ttk.Button(edit_frame, text="💾 儲存修改", command=submit, style='TButton').grid(row=5, column=0, columnspan=2, pady=10, sticky='we')
+        edit_window.bind('<Return>', lambda event: submit())
+
+    def edit_transaction(self, record: Dict[str, Any], edit_window: tk.Toplevel, form: Dict[str, str]):
+        """驗證編輯內容、就地套用並寫入一筆日誌。"""
+        if not form['amount'] or not form['category'] or not form['date']:
+            messagebox.showerror("輸入錯誤", "日期、金額與類別欄位不能為空！", parent=edit_window)
+            return
+        try:
+            form['date'] = self.normalize_date(form['date'])
+        except ValueError:
+            messagebox.showerror("輸入錯誤", f"日期格式不正確，請使用 {self.DATE_FORMAT} 格式 (例如: 2023-11-30)。", parent=edit_window)
+            return
+        try:
+            amount_cents = to_cents(form.pop('amount'))
+        except ValueError:
+            messagebox.showerror("輸入錯誤", "金額必須是有效的數字！", parent=edit_window)
+            return
+        if amount_cents <= 0:
+            messagebox.showerror("輸入錯誤", "金額必須是正數。", parent=edit_window)
+            return
+
+        if 'rule_id' in record:
+            edit_window.destroy()
+            self.materialize_occurrence(record, form, amount_cents)
+            return
+
+        changes = {k: v for k, v in form.items() if record[k] != v}
+        if amount_cents != self.amount_cents(record):
+            changes['amount_cents'] = amount_cents
+        edit_window.destroy()
+        if not changes:
+            return
+
+        try:
+            if 'date' in changes:
+                self.ensure_history_loaded(changes['date']) # 移到未載入的封存年度時先載入
+            self._mark_dirty(record)
+            affected = self.apply_edit(record, changes)
+            self._mark_dirty(record)
+            self._ledger_changed()
+            if min(self._dirty_years) < self.hot_year():
+                # 封存年度的分段檔需要重寫，日誌只用於今年的修改
+                self.save_transactions()
+            else:
+                self.append_journal({"op": "edit", "id": record['id'], "fields": changes})
+
+            if 'date' in changes or self.recurring.rules:
+                # 排序位置改變 (或週期交易的顯示餘額也受影響)，重新載入目前檢視
+                self.refresh_current_view()
+            else:
+                self.update_balance_display()
+                for r in affected:
+                    if self.tree.exists(r['id']):
+                        tag = 'income_tag' if r['type'] == '收入' else 'expense_tag'
+                        self.tree.item(r['id'], values=self._row_values(r), tags=(tag,))
+                self.update_chart_if_active()
+                self.update_budget_panel()
+            self.warn_if_over_budget(record)
+
+        except Exception as e:
+            messagebox.showerror("錯誤", f"無法修改該交易記錄: {e}", parent=self.master)
 
     def delete_transaction(self):
         selected_item_id = self.tree.focus()
@@ -642,12 +2416,25 @@ class ExpenseTrackerApp:
             return
 
         try:
-            # Treeview IID 存儲的是在 self.transactions 中的原始索引
-            transaction_index_to_delete = int(selected_item_id)
+            # Treeview IID 存儲的是交易的 id
+            record = self.record_for_iid(selected_item_id)
+            if record is None:
+                messagebox.showwarning("刪除警告", "請先在表格中選中一條記錄。", parent=self.master)
+                return
+            if 'rule_id' in record:
+                self.delete_occurrence(record)
+                return
             if not messagebox.askyesno("確認刪除", "確定要刪除這筆交易記錄嗎？", parent=self.master):
                 return
 
-            del self.transactions[transaction_index_to_delete]
+            # 刪除後其後每筆的餘額都少了這筆金額，先確認不會超出範圍
+            later = self.transactions[self._record_position(record) + 1:]
+            self.money.check_shift([r['id'] for r in later], -self.signed_cents(record))
+
+            self.transactions.remove(record)
+            self._unregister_record(record)
+            self._mark_dirty(record)
+            self._ledger_changed()
 
             self.recalculate_balance() # 刪除後必須重新計算餘額
             self.save_transactions()
@@ -669,13 +2456,13 @@ class ExpenseTrackerApp:
                 return
 
             try:
-                dt.datetime.strptime(date_str, self.DATE_FORMAT)
+                date_str = self.normalize_date(date_str)
             except ValueError:
                 messagebox.showerror("輸入錯誤", f"日期格式不正確，請使用 {self.DATE_FORMAT} 格式 (例如: 2023-11-30)。")
                 return
 
-            amount = float(amount_str)
-            if amount <= 0:
+            amount_cents = to_cents(amount_str)
+            if amount_cents <= 0:
                 messagebox.showerror("輸入錯誤", "金額必須是正數。")
                 return
 
@@ -683,26 +2470,376 @@ class ExpenseTrackerApp:
             record = {
                 "date": date_str,
                 "type": transaction_type,
-                "amount": amount,
                 "category": category,
                 "description": description,
-                "new_balance": 0.0 # 暫時設為 0，recalculate_balance 會修正
             }
-            self.transactions.append(record)
-
-            self.recalculate_balance() # 新增後必須重新計算餘額
-            self.save_transactions()
+            if self.repeat_var.get() in RECURRING_FREQUENCIES:
+                if not self.add_recurring_rule(record, amount_cents):
+                    return
+            else:
+                self.add_records([(record, amount_cents)])
+                self.show_all_transactions()
+            self.warn_if_over_budget(record)
 
             # 清空輸入欄位
             self.amount_entry.delete(0, tk.END)
             self.description_entry.delete(0, tk.END)
             self.date_var.set(dt.datetime.now().strftime(self.DATE_FORMAT))
+            self.repeat_var.set("不重複")
+            self.repeat_end_var.set("")
 
-        except ValueError:
-            messagebox.showerror("輸入錯誤", "金額必須是有效的數字！")
+        except ValueError as e: # 金額格式錯誤，或加入後餘額超出範圍
+            messagebox.showerror("輸入錯誤", f"金額必須是有效的數字！\n{e}")
         except Exception as e:
             messagebox.showerror("錯誤", f"發生了一個錯誤: {e}")
 
+    def add_records(self, entries: List[tuple]) -> List[Dict[str, Any]]:
+        """
+        新增多筆 (記錄欄位, 金額分)：只重算一次餘額、存檔一次，回傳新增的記錄。
+        表單與本機 API 共用；呼叫端負責更新畫面。
+        先驗證全部內容，有任何一筆不合法就拋出 ValueError，帳本保持不變。
+        """
+        if not entries:
+            return []
+        for fields, amount_cents in entries:
+            self.normalize_date(fields['date'])
+            if fields['type'] not in ('收入', '支出'):
+                raise ValueError(f"無效的類型: {fields['type']}")
+            if check_cents(amount_cents) <= 0:
+                raise ValueError("金額必須是正數")
+        self.ensure_history_loaded(min(fields['date'] for fields, _ in entries)) # 日期落在未載入的封存年度時先載入
+
+        records = []
+        for fields, amount_cents in entries:
+            record = dict(fields)
+            self.transactions.append(record)
+            self._register_record(record)
+            self.money.set_amount(record['id'], amount_cents, record['type'] == '支出')
+            self._track_spending(record, 1)
+            self._mark_dirty(record)
+            records.append(record)
+        self._ledger_changed()
+
+        try:
+            self._recompute_all_balances() # 新增後必須重新計算餘額
+        except ValueError:
+            # 餘額會超出 int64：移除這批記錄，帳本回到新增前的狀態
+            added = {r['id'] for r in records}
+            self.transactions[:] = [r for r in self.transactions if r['id'] not in added]
+            for record in records:
+                self._unregister_record(record)
+            self._recompute_all_balances()
+            raise
+        self.save_transactions()
+        return records
+
+    # --------------------------------------------------------------------
+    # --- 匯出 ---
+    # --------------------------------------------------------------------
+
+    def export_rows(self, records: List[Dict[str, Any]]):
+        """匯出用的資料列產生器 (金額與餘額為 Decimal 元)；匯出期間已被刪除的記錄略過。"""
+        for r in records:
+            if 'rule_id' not in r and r['id'] not in self.records_by_id:
+                continue
+            yield (r['date'], r['type'], Decimal(self.amount_cents(r)).scaleb(-2), r['category'],
+                   r['description'], Decimal(self.display_balance_cents(r)).scaleb(-2))
+
+    def export_current_view(self):
+        """
+        把目前檢視 (current_filtered_transactions) 匯出為 CSV 或 XLSX，不阻塞視窗：
+        Tk 執行緒每次由產生器取出一批資料列放入有上限的佇列 (帳本不是執行緒安全的)，
+        背景執行緒負責寫檔；進度視窗可隨時取消。
+        """
+        filetypes = [("CSV 檔案", "*.csv")]
+        if openpyxl is not None:
+            filetypes.append(("Excel 活頁簿", "*.xlsx"))
+        path = filedialog.asksaveasfilename(parent=self.master, title="匯出目前檢視",
+                                            defaultextension=".csv", filetypes=filetypes)
+        if not path:
+            return
+        if path.lower().endswith('.xlsx') and openpyxl is None:
+            messagebox.showerror("匯出錯誤", "匯出 Excel 需要安裝 openpyxl，請改用 CSV。", parent=self.master)
+            return
+
+        records = list(self.current_filtered_transactions) # 目前檢視的快照 (只複製參照)
+        total = len(records)
+        rows = self.export_rows(records)
+        chunk_queue: "queue.Queue" = queue.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+        state = {'written': 0, 'cancel': threading.Event(), 'error': None, 'done': False}
+
+        # --- 進度視窗 ---
+        export_window = tk.Toplevel(self.master)
+        export_window.title("📤 匯出中")
+        export_window.configure(bg='#F0F8FF')
+        export_window.resizable(False, False)
+        export_window.transient(self.master)
+
+        export_frame = tk.Frame(export_window, bg='#F0F8FF', padx=20, pady=10)
+        export_frame.pack(expand=True)
+        tk.Label(export_frame, text=os.path.basename(path), bg='#F0F8FF').pack(anchor='w')
+        progress = ttk.Progressbar(export_frame, maximum=max(total, 1), length=320)
+        progress.pack(pady=8)
+        status_var = tk.StringVar(value=f"已匯出 0 / {total:,} 筆")
+        tk.Label(export_frame, textvariable=status_var, bg='#F0F8FF').pack(anchor='w')
+
+        def cancel():
+            state['cancel'].set()
+            try:
+                chunk_queue.put_nowait(None) # 喚醒正在等待資料的寫入執行緒
+            except queue.Full:
+                pass # 寫入執行緒取出下一批時就會發現已取消
+            cancel_button.config(state=tk.DISABLED)
+            status_var.set("正在取消……")
+
+        cancel_button = ttk.Button(export_frame, text="取消", command=cancel)
+        cancel_button.pack(pady=(8, 0))
+        export_window.protocol("WM_DELETE_WINDOW", cancel)
+
+        pending: List[tuple] = []
+
+        def produce():
+            """(Tk 執行緒) 取出一批資料列放入佇列；佇列已滿時稍後再試，不會卡住視窗。"""
+            nonlocal pending
+            if state['cancel'].is_set() or state['done']:
+                # 已取消，或寫入執行緒已結束 (例如寫檔失敗) 不再讀取佇列：停止排程並釋放產生器
+                rows.close()
+                pending = []
+                return
+            if not pending:
+                pending = list(islice(rows, EXPORT_CHUNK))
+            try:
+                chunk_queue.put_nowait(pending or None) # 空批次表示已全部產生
+            except queue.Full:
+                self.master.after(EXPORT_POLL_MS, produce)
+                return
+            if pending:
+                pending = []
+                self.master.after(1, produce)
+
+        def poll():
+            progress['value'] = state['written']
+            if not state['cancel'].is_set():
+                status_var.set(f"已匯出 {state['written']:,} / {total:,} 筆")
+            if not state['done']:
+                export_window.after(EXPORT_POLL_MS, poll)
+                return
+            export_window.destroy()
+            if state['error'] is not None:
+                messagebox.showerror("匯出錯誤", f"無法匯出到 {path}: {state['error']}", parent=self.master)
+            elif state['cancel'].is_set():
+                messagebox.showinfo("匯出", "已取消匯出。", parent=self.master)
+            else:
+                messagebox.showinfo("匯出完成", f"已匯出 {state['written']:,} 筆記錄到 {path}", parent=self.master)
+
+        threading.Thread(target=run_export_writer, args=(path, chunk_queue, state), daemon=True).start()
+        produce()
+        poll()
+
+    # --------------------------------------------------------------------
+    # --- 週期交易 ---
+    # --------------------------------------------------------------------
+
+    def record_for_iid(self, iid: str) -> Optional[Dict[str, Any]]:
+        """表格 iid 對應的記錄 (一般記錄或週期交易的一次發生)；找不到時回傳 None。"""
+        if iid.startswith('R'):
+            return self.recurring.lookup(iid)
+        try:
+            return self.records_by_id.get(int(iid))
+        except ValueError:
+            return None # 「無記錄」提示列或未選取
+
+    def with_occurrences(self, records: List[Dict[str, Any]], criteria) -> List[Dict[str, Any]]:
+        """
+        在 (按日期排序的) 記錄中併入篩選條件範圍內的週期交易，同一天的週期交易排在前面。
+        篩選條件指定了結束日期時展開到該日為止；未指定 (OPEN_END_DATE) 時，
+        沒有結束日期的規則只預估到 RECURRING_PROJECTION_DAYS 天後，才不會無限展開。
+        """
+        if not self.recurring.rules:
+            return records
+        start_str, end_str, categories, keyword = criteria
+        horizon = None
+        if end_str >= OPEN_END_DATE:
+            horizon = (dt.date.today() + dt.timedelta(days=RECURRING_PROJECTION_DAYS)).isoformat()
+        occurrences = self.recurring.occurrences(start_str, end_str, categories, keyword, horizon)
+        return list(heapq.merge(occurrences, records, key=lambda r: r['date']))
+
+    def all_view_records(self) -> List[Dict[str, Any]]:
+        """「顯示全部記錄」檢視：已載入的記錄，加上同一期間 (含未來預估) 的週期交易。"""
+        unloaded = self.unloaded_archive_years()
+        start_str = f"{max(unloaded) + 1:04d}-01-01" if unloaded else "0001-01-01"
+        return self.with_occurrences(self.transactions, (start_str, OPEN_END_DATE, frozenset(), ''))
+
+    def display_balance_cents(self, record: Dict[str, Any]) -> int:
+        """顯示用的餘額：一般記錄的累計餘額，加上當天 (含) 以前所有週期交易的淨額。"""
+        if 'rule_id' in record:
+            pos = self._date_lower_bound(record['date'])
+            balance = self.balance_cents(self.transactions[pos - 1]) if pos > 0 else self._base_balance
+        else:
+            balance = self.balance_cents(record)
+        return balance + self.recurring.total_until(record['date'])
+
+    def current_balance(self) -> int:
+        """目前總餘額：一般記錄加上今天 (含) 以前已發生的週期交易。"""
+        return self.balance + self.recurring.total_until(dt.date.today().isoformat())
+
+    def save_recurring(self):
+        """週期規則存檔：在檔案鎖內先併入其他程式的規則，避免互相覆蓋。"""
+        try:
+            with self.locked_store():
+                self._sync_from_store()
+                self.recurring.save()
+                self._synced_rules = self.recurring.snapshot()
+                self._store_stat = self._store_signature()
+        except Exception as e:
+            if self.master is None:
+                raise
+            messagebox.showerror("存檔錯誤", f"無法儲存週期交易規則 {RECURRING_FILE}: {e}", parent=self.master)
+
+    def recurring_changed(self):
+        """週期規則變動：存檔並重新整理檢視 (一般記錄的累計餘額不受影響，不必重算)。"""
+        self.save_recurring()
+        self._ledger_changed()
+        self.refresh_current_view()
+
+    def add_recurring_rule(self, fields: Dict[str, Any], amount_cents: int) -> bool:
+        """以表單內容新增週期規則 (開始日期為表單日期)；結束日期格式錯誤時回傳 False。"""
+        end_str = self.repeat_end_var.get().strip()
+        if end_str:
+            try:
+                end_str = self.normalize_date(end_str)
+            except ValueError:
+                messagebox.showerror("輸入錯誤", f"結束日期格式不正確，請使用 {self.DATE_FORMAT} 格式 (或留空表示不結束)。")
+                return False
+            if end_str < fields['date']:
+                messagebox.showerror("輸入錯誤", "結束日期不能早於開始日期！")
+                return False
+        self.recurring.add(dict(fields, start=self.normalize_date(fields['date']), end=end_str or None,
+                                freq=RECURRING_FREQUENCIES[self.repeat_var.get()], amount_cents=amount_cents))
+        self.recurring_changed()
+        return True
+
+    def materialize_occurrence(self, occurrence: Dict[str, Any], fields: Dict[str, Any], amount_cents: int):
+        """編輯週期交易的某一次：規則略過該日期，編輯後的內容存為一般記錄。"""
+        try:
+            self.recurring.skip(occurrence['rule_id'], occurrence['date'])
+            self.save_recurring()
+            record = self.add_records([(fields, amount_cents)])[0]
+            self.refresh_current_view()
+            self.warn_if_over_budget(record)
+        except Exception as e:
+            messagebox.showerror("錯誤", f"無法修改該交易記錄: {e}", parent=self.master)
+
+    def delete_occurrence(self, occurrence: Dict[str, Any]):
+        """
+        刪除週期交易：可只略過這一次，或從這一次起結束規則。
+        之前已發生的部分保留，過去的餘額、預算與趨勢圖不會被回溯改變。
+        """
+        answer = messagebox.askyesnocancel("刪除週期交易",
+                                           f"這是一筆週期交易。\n是：從 {occurrence['date']} 起結束週期規則 (之前的保留)\n否：只刪除這一次",
+                                           parent=self.master)
+        if answer is None:
+            return
+        if answer:
+            self.recurring.end_before(occurrence['rule_id'], occurrence['date'])
+        else:
+            self.recurring.skip(occurrence['rule_id'], occurrence['date'])
+        self.recurring_changed()
+
+    # --------------------------------------------------------------------
+    # --- 每月預算 ---
+    # --------------------------------------------------------------------
+
+    def budget_status(self, month: str) -> List[tuple]:
+        """
+        指定月份各類別的 (類別, 預算, 已支出)，金額為整數分、未設預算時為 None。
+        直接讀取 month_spending 的累計，與當月記錄筆數無關；另加上當月的週期交易。
+        """
+        recurring = self._recurring_month_spending(month)
+        categories = list(self.categories) + sorted(set(self.budgets) - set(self.categories))
+        return [(c, self.budgets.get(c), self.month_spending.get((month, c), 0) + recurring.get(c, 0)) for c in categories]
+
+    def _recurring_month_spending(self, month: str) -> Dict[str, int]:
+        """指定月份 (YYYY-MM) 週期交易的各類別支出。"""
+        first_day = dt.date.fromisoformat(month + "-01")
+        last_day = add_months(first_day, 1, 1) - dt.timedelta(days=1)
+        spending: Dict[str, int] = defaultdict(int)
+        for occurrence in self.recurring.occurrences(first_day.isoformat(), last_day.isoformat()):
+            if occurrence['type'] == '支出':
+                spending[occurrence['category']] += occurrence['amount_cents']
+        return spending
+
+    def update_budget_panel(self, load_history: bool = False):
+        """依 budget_month_var 的月份更新預算面板；月份格式不正確時清空面板。"""
+        if not hasattr(self, 'budget_tree'):
+            return # 介面尚未建立
+        self.budget_tree.delete(*self.budget_tree.get_children())
+        month = self.budget_month_var.get().strip()
+        try:
+            dt.datetime.strptime(month, "%Y-%m")
+        except ValueError:
+            return
+        if load_history and self.ensure_history_loaded(month + "-01"): # 月份落在未載入的封存年度時先載入
+            self.refresh_current_view()
+            return
+
+        for category, budget, spent in self.budget_status(month):
+            if budget is None:
+                values = (category, "未設定", format_cents(spent), "", "")
+                tags = ()
+            else:
+                usage = spent / budget if budget else 0
+                values = (category, format_cents(budget), format_cents(spent), format_cents(budget - spent), f"{usage:.0%}")
+                tags = ('over_tag',) if spent > budget else ('near_tag',) if usage >= 0.8 else ()
+            self.budget_tree.insert('', tk.END, iid=category, values=values, tags=tags)
+
+    def edit_budget(self, event=None):
+        """雙擊預算面板的類別：設定或清除該類別的每月預算。"""
+        category = self.clicked_row(self.budget_tree, event)
+        if not category:
+            return # 雙擊標題或空白處
+        current = self.budgets.get(category)
+        answer = simpledialog.askstring("設定預算", f"「{category}」每月預算 (留空表示不設預算):",
+                                        initialvalue=format_cents(current, grouping=False) if current else "",
+                                        parent=self.master)
+        if answer is None:
+            return
+        if not answer.strip():
+            self.budgets.pop(category, None)
+        else:
+            try:
+                budget = to_cents(answer)
+            except ValueError:
+                messagebox.showerror("輸入錯誤", "預算必須是有效的數字！", parent=self.master)
+                return
+            if budget <= 0:
+                messagebox.showerror("輸入錯誤", "預算必須是正數。", parent=self.master)
+                return
+            self.budgets[category] = budget
+        self.store_budgets()
+        self.update_budget_panel()
+
+    def store_budgets(self):
+        """預算存檔：在檔案鎖內先併入其他程式的預算，避免互相覆蓋。"""
+        with self.locked_store():
+            self._sync_from_store()
+            save_budgets(self.budgets)
+            self._synced_budgets = dict(self.budgets)
+            self._store_stat = self._store_signature()
+
+    def warn_if_over_budget(self, record: Dict[str, Any]):
+        """新增或修改支出後，若該月該類別已超出預算則提出警告。"""
+        if record['type'] != '支出' or record['category'] not in self.budgets:
+            return
+        month = record['date'][:7]
+        budget = self.budgets[record['category']]
+        spent = self.month_spending.get((month, record['category']), 0) + self._recurring_month_spending(month).get(record['category'], 0)
+        if spent > budget:
+            messagebox.showwarning("超出預算",
+                                   f"{month}「{record['category']}」已支出 {format_cents(spent)} 元，"
+                                   f"超出預算 {format_cents(budget)} 元 ({format_cents(spent - budget)} 元)。",
+                                   parent=self.master)
+
     # --------------------------------------------------------------------
     # --- 動態圖表繪製方法 (已修正並補全) ---
     # --------------------------------------------------------------------
@@ -734,7 +2871,10 @@ class ExpenseTrackerApp:
 
         transactions_to_analyze = self.current_filtered_transactions
 
-        if not transactions_to_analyze:
+        # 「顯示全部記錄」時，未載入的封存年度以封存索引中的彙總呈現
+        archived_rollups = self._viewing_all and bool(self.unloaded_archive_years())
+
+        if not transactions_to_analyze and not archived_rollups:
             tk.Label(self.chart_container, text="目前沒有記錄，無法產生分析圖表。", font=('Microsoft YaHei', 12), fg='red', bg='#F0F8FF').pack(pady=50)
             return
 
@@ -745,6 +2885,8 @@ class ExpenseTrackerApp:
             status_text = f"📊 分析篩選記錄 (類別: {', '.join(selected_categories)})"
         else:
             status_text = "🌐 分析所有記錄 (總覽)"
+        if archived_rollups:
+            status_text += "\n(封存年度以月彙總呈現，放大折線圖可載入完整記錄)"
 
         tk.Label(self.chart_container, text=status_text,
                  font=('Microsoft YaHei', 12, 'bold'), fg='#000093', bg='#F0F8FF').pack(pady=(5, 10))
@@ -764,20 +2906,56 @@ class ExpenseTrackerApp:
         self.chart_container.update_idletasks()
         self.chart_canvas.config(scrollregion=self.chart_canvas.bbox("all"))
 
+    def view_aggregate(self, name: str, compute, transactions_to_analyze: List[Dict[str, Any]]):
+        """取得目前檢視的圖表彙總；同一檢視已計算過時直接由快取回傳。"""
+        entry = self._current_view_entry
+        if entry is not None and name in entry:
+            return entry[name]
+        result = compute(transactions_to_analyze)
+        if entry is not None:
+            entry[name] = result
+        return result
+
+    def compute_category_totals(self, transactions_to_analyze: List[Dict[str, Any]]) -> Dict[str, float]:
+        """彙總各類別的支出總額 (以整數分累加，回傳元)。"""
+        category_totals: Dict[str, int] = {}
+        for t in transactions_to_analyze:
+            if t['type'] == '支出':
+                category_totals[t['category']] = category_totals.get(t['category'], 0) + self.amount_cents(t)
+        for meta in self._unloaded_rollups():
+            for category, cents in meta['category_expense'].items():
+                category_totals[category] = category_totals.get(category, 0) + cents
+        for occurrence in self._unloaded_occurrences():
+            if occurrence['type'] == '支出':
+                category_totals[occurrence['category']] = category_totals.get(occurrence['category'], 0) + occurrence['amount_cents']
+        return {k: v / 100 for k, v in category_totals.items()}
+
+    def _unloaded_rollups(self) -> List[Dict[str, Any]]:
+        """「顯示全部記錄」時，尚未載入的封存年度的索引資料 (由舊到新)；其他檢視回傳空列表。"""
+        if not self._viewing_all:
+            return []
+        return [self.archive_manifest['years'][str(y)] for y in self.unloaded_archive_years()]
+
+    def _unloaded_occurrences(self):
+        """
+        「顯示全部記錄」時落在未載入封存年度的週期交易 (封存索引的彙總只含一般記錄，
+        all_view_records 也從最後一個未載入年度之後才併入週期交易)；其他檢視回傳空的產生器。
+        """
+        unloaded = self.unloaded_archive_years() if self._viewing_all else []
+        if not unloaded or not self.recurring.rules:
+            return iter(())
+        return self.recurring.occurrences("0001-01-01", f"{max(unloaded):04d}-12-31")
+
     def create_pie_chart(self, frame, transactions_to_analyze: List[Dict[str, Any]]):
         """繪製圓餅圖 (總覽模式)"""
 
         CURRENCY_SYMBOL = "NT$"
-        expenses = [t for t in transactions_to_analyze if t['type'] == '支出']
+        category_totals = self.view_aggregate('category_totals', self.compute_category_totals, transactions_to_analyze)
 
-        if not expenses:
+        if not category_totals:
             tk.Label(frame, text="目前沒有支出記錄，無法產生圓餅圖。", font=('Microsoft YaHei', 10), fg='#555', bg='#F0F8FF').pack(pady=10)
             return
 
-        category_totals: Dict[str, float] = {}
-        for t in expenses:
-            category_totals[t['category']] = category_totals.get(t['category'], 0.0) + t['amount']
-
         # 排除金額為 0 的類別
         valid_totals = {k: v for k, v in category_totals.items() if v > 0}
         labels = list(valid_totals.keys())
@@ -812,67 +2990,82 @@ class ExpenseTrackerApp:
         canvas.draw()
 
 
-    def create_line_chart(self, frame, transactions_to_analyze: List[Dict[str, Any]]):
-        """繪製金額淨變動對時間的折線圖"""
-
+    def compute_daily_balance_series(self, transactions_to_analyze: List[Dict[str, Any]]):
+        """
+        計算分析區間內每天的累計餘額 (x 為 Matplotlib 日期數值)，以及預估 (今天以後) 的起點索引。
+        結果透過 view_aggregate 快取，縮放圖表時只需重新降採樣，不必重新彙總交易。
+        """
         # 確保交易按日期排序以獲得正確的趨勢線
         transactions_to_analyze.sort(key=lambda t: dt.datetime.strptime(t['date'], self.DATE_FORMAT))
 
-        # 使用 defaultdict 來累積每天的淨變動
-        daily_net_change: Dict[dt.date, float] = defaultdict(float)
+        # 使用 defaultdict 來累積每天的淨變動 (整數分)
+        daily_net_change: Dict[str, int] = defaultdict(int)
 
-        # 計算每天的淨變動
+        # 計算每天的淨變動 (含週期交易)
         for t in transactions_to_analyze:
-            record_date = dt.datetime.strptime(t['date'], self.DATE_FORMAT).date()
-            amount = t['amount']
-            if t['type'] == '支出':
-                amount = -amount
-            daily_net_change[record_date] += amount
+            daily_net_change[t['date']] += self.signed_cents(t)
+
+        cumulative_balances_list: List[float] = []
+        dates: List[dt.date] = []
+
+        # 未載入的封存年度：以月底餘額 (由月彙總推算) 作為較粗的前段趨勢
+        for meta in self._unloaded_rollups():
+            running = meta['opening_balance_cents']
+            for month in sorted(meta['monthly']):
+                totals = meta['monthly'][month]
+                running += totals['收入'] - totals['支出']
+                year, month_number = int(month[:4]), int(month[5:])
+                next_month = dt.date(year + month_number // 12, month_number % 12 + 1, 1)
+                month_end = next_month - dt.timedelta(days=1)
+                dates.append(month_end)
+                cumulative_balances_list.append((running + self.recurring.total_until(month_end.isoformat())) / 100)
 
         if not daily_net_change:
-            tk.Label(frame, text="目前沒有記錄，無法產生趨勢圖。", font=('Microsoft YaHei', 10), fg='#555', bg='#F0F8FF').pack(pady=10)
-            return
+            return (list(mdates.date2num(dates)), cumulative_balances_list, len(dates))
 
         # 處理分析區間的起始餘額
         first_date_in_analysis = min(daily_net_change.keys())
-        # 查找此分析區間開始前的餘額
-        initial_balance = 0.0
-        for record in self.transactions:
-            record_date = dt.datetime.strptime(record['date'], self.DATE_FORMAT).date()
-            if record_date < first_date_in_analysis:
-                initial_balance = record['new_balance']
-            elif record_date == first_date_in_analysis:
-                # 找到分析區間第一天的第一筆交易前的餘額
-                # 由於 self.transactions 已按日期排序，我們只需找到第一筆記錄前的餘額
-                try:
-                    # 找到第一筆交易在 sorted self.transactions 中的索引
-                    index = next(i for i, r in enumerate(self.transactions) if dt.datetime.strptime(r['date'], self.DATE_FORMAT).date() == first_date_in_analysis)
-                    if index > 0:
-                        initial_balance = self.transactions[index - 1]['new_balance']
-                    break # 找到後即可退出迴圈
-                except StopIteration:
-                    pass
+        # 查找此分析區間開始前的餘額 (self.transactions 已按日期排序)
+        first_index = self._date_lower_bound(first_date_in_analysis)
+        initial_balance = self.balance_cents(self.transactions[first_index - 1]) if first_index > 0 else self._base_balance
+        day_before = dt.date.fromisoformat(first_date_in_analysis) - dt.timedelta(days=1)
+        initial_balance += self.recurring.total_until(day_before.isoformat())
 
         # 從起始日期開始，計算累計餘額
         current_cumulative_balance = initial_balance
-        cumulative_balances_list: List[float] = []
-        dates: List[dt.date] = []
 
         # 排序日期以確保折線圖正確
-        sorted_dates = sorted(daily_net_change.keys())
+        for date in sorted(daily_net_change.keys()):
+            current_cumulative_balance += daily_net_change[date]
+            dates.append(dt.datetime.strptime(date, self.DATE_FORMAT).date())
+            cumulative_balances_list.append(current_cumulative_balance / 100)
 
-        for date in sorted_dates:
-            net_change = daily_net_change[date]
-            current_cumulative_balance += net_change
-            dates.append(date)
-            cumulative_balances_list.append(current_cumulative_balance)
+        # 今天之後的點 (未來的週期交易或記錄) 為預估，折線圖以虛線顯示
+        projection_start = bisect_right(dates, dt.date.today())
+        return (list(mdates.date2num(dates)), cumulative_balances_list, projection_start)
+
+    def create_line_chart(self, frame, transactions_to_analyze: List[Dict[str, Any]]):
+        """繪製金額淨變動對時間的折線圖 (依畫布寬度降採樣，縮放時恢復完整解析度)"""
+
+        xs, ys, projection_start = self.view_aggregate('daily_series', self.compute_daily_balance_series, transactions_to_analyze)
+
+        if not xs:
+            tk.Label(frame, text="目前沒有記錄，無法產生趨勢圖。", font=('Microsoft YaHei', 10), fg='#555', bg='#F0F8FF').pack(pady=10)
+            return
 
         # --- Matplotlib 繪圖 ---
         fig = Figure(figsize=(8, 6))
         ax = fig.add_subplot(111)
-        
 
-        ax.plot(dates, cumulative_balances_list, marker='o', linestyle='-', color='#000093')
+        line, = ax.plot([], [], linestyle='-', color='#000093')
+        # 實際與預估兩段分別降採樣；預估段從最後一個實際點接續
+        segments = [(line, xs[:projection_start], ys[:projection_start])]
+        if projection_start < len(xs):
+            projected_line, = ax.plot([], [], linestyle='--', color='#888888', label='預估 (週期交易)')
+            joint = max(projection_start - 1, 0)
+            segments.append((projected_line, xs[joint:], ys[joint:]))
+            ax.legend(loc='best')
+        ax.xaxis_date()
         ax.set_title("餘額變動趨勢", fontsize=14, fontweight='bold')
         ax.set_xlabel("日期", fontsize=12)
         ax.set_ylabel("累計餘額 (NT$)", fontsize=12)
@@ -881,24 +3074,81 @@ class ExpenseTrackerApp:
         fig.autofmt_xdate(rotation=45)
         ax.grid(True, linestyle='--', alpha=0.6)
 
-        canvas = FigureCanvasTkAgg(fig, master=frame)
+        # 圖表與縮放工具列放在同一個子框架內
+        line_frame = tk.Frame(frame, bg='#F0F8FF')
+        line_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        canvas = FigureCanvasTkAgg(fig, master=line_frame)
+        toolbar = NavigationToolbar2Tk(canvas, line_frame, pack_toolbar=False)
+        toolbar.update()
+        toolbar.pack(side=tk.BOTTOM, fill=tk.X)
+
+        def resample(x_min, x_max):
+            """只取可見範圍內的點，並降採樣到軸的像素寬度。"""
+            pixel_width = int(ax.get_window_extent().width)
+            for seg_line, seg_xs, seg_ys in segments:
+                lo = max(bisect_left(seg_xs, x_min) - 1, 0)
+                hi = min(bisect_right(seg_xs, x_max) + 1, len(seg_xs))
+                sx, sy = lttb_downsample(seg_xs[lo:hi], seg_ys[lo:hi], max(pixel_width, TREND_MIN_POINTS))
+                seg_line.set_data(sx, sy)
+                seg_line.set_marker('o' if len(sx) <= TREND_MARKER_LIMIT else '')
+
+        # 初始顯示整個區間 (或載入封存前使用者縮放到的範圍)
+        if xs[0] == xs[-1]:
+            initial_xlim = (xs[0] - 1, xs[-1] + 1)
+        else:
+            initial_xlim = (xs[0], xs[-1])
+        shown_xlim = self._pending_trend_xlim or initial_xlim
+        self._pending_trend_xlim = None
+        resample(*shown_xlim)
+        ax.set_xlim(*shown_xlim)
+        ax.relim()
+        ax.autoscale_view(scalex=False)
+
+        # 已載入記錄的起點；放大到更早 (封存月彙總) 的區段時，延遲載入該年度之後的封存
+        loaded_start = mdates.date2num(dt.datetime.strptime(self.transactions[0]['date'], self.DATE_FORMAT)) if self.transactions else None
+        has_rollups = bool(self._unloaded_rollups())
+
+        def on_xlim_changed(changed_ax):
+            x_min, x_max = changed_ax.get_xlim()
+            zoomed_in = (x_max - x_min) < (initial_xlim[1] - initial_xlim[0])
+            if has_rollups and zoomed_in and not self._history_load_pending and (loaded_start is None or x_min < loaded_start):
+                self._history_load_pending = True
+                self.master.after_idle(self.load_history_for_chart, mdates.num2date(x_min).year, (x_min, x_max))
+            resample(x_min, x_max)
+            canvas.draw_idle()
+
+        ax.callbacks.connect('xlim_changed', on_xlim_changed)
+
         canvas_widget = canvas.get_tk_widget()
-        canvas_widget.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        canvas_widget.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
         canvas.draw()
 
-    def create_monthly_bar_chart(self, frame, transactions_to_analyze: List[Dict[str, Any]]):
-        """繪製每月收入與支出比較的長條圖"""
+    def compute_monthly_totals(self, transactions_to_analyze: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+        """彙總每月的收入與支出總額 (以整數分累加，回傳元)。"""
+        monthly_data = defaultdict(lambda: {'收入': 0, '支出': 0})
 
-        monthly_data = defaultdict(lambda: {'收入': 0.0, '支出': 0.0})
+        # 未載入的封存年度直接使用封存索引中的月彙總
+        for meta in self._unloaded_rollups():
+            for month_key, totals in meta['monthly'].items():
+                monthly_data[month_key]['收入'] += totals['收入']
+                monthly_data[month_key]['支出'] += totals['支出']
+        for occurrence in self._unloaded_occurrences():
+            monthly_data[occurrence['date'][:7]][occurrence['type']] += occurrence['amount_cents']
 
         for t in transactions_to_analyze:
             date_obj = dt.datetime.strptime(t['date'], self.DATE_FORMAT)
             month_key = date_obj.strftime("%Y-%m") # 格式：2023-11
 
-            if t['type'] == '收入':
-                monthly_data[month_key]['收入'] += t['amount']
-            elif t['type'] == '支出':
-                monthly_data[month_key]['支出'] += t['amount']
+            if t['type'] in ('收入', '支出'):
+                monthly_data[month_key][t['type']] += self.amount_cents(t)
+
+        return {m: {k: v / 100 for k, v in totals.items()} for m, totals in monthly_data.items()}
+
+    def create_monthly_bar_chart(self, frame, transactions_to_analyze: List[Dict[str, Any]]):
+        """繪製每月收入與支出比較的長條圖"""
+
+        monthly_data = self.view_aggregate('monthly_totals', self.compute_monthly_totals, transactions_to_analyze)
 
         if not monthly_data:
             tk.Label(frame, text="目前沒有收入或支出記錄，無法產生月度比較圖。", font=('Microsoft YaHei', 10), fg='#555', bg='#F0F8FF').pack(pady=10)
@@ -936,16 +3186,313 @@ class ExpenseTrackerApp:
         canvas.draw()
 
 
-if __name__ == '__main__':
-    root = tk.Tk()
-    app = None
+# --- 本機 HTTP/JSON API ---
+def parse_transaction_payload(data) -> tuple:
+    """驗證 API 傳入的一筆交易，回傳 (記錄欄位, 金額分)；格式錯誤時拋出 ValueError。"""
+    if not isinstance(data, dict):
+        raise ValueError("交易必須是 JSON 物件")
+    date_str = str(data.get('date', '')).strip()
+    try:
+        date_str = ExpenseTrackerApp.normalize_date(date_str)
+    except ValueError:
+        raise ValueError(f"日期格式不正確，請使用 {ExpenseTrackerApp.DATE_FORMAT} 格式: {date_str!r}")
+    if data.get('type') not in ('收入', '支出'):
+        raise ValueError("type 必須是 '收入' 或 '支出'")
+    category = str(data.get('category', '')).strip()
+    if not category:
+        raise ValueError("category 不能為空")
+    if 'amount_cents' in data:
+        amount_cents = data['amount_cents']
+        if not isinstance(amount_cents, int) or isinstance(amount_cents, bool):
+            raise ValueError("amount_cents 必須是整數")
+        check_cents(amount_cents)
+    else:
+        amount_cents = to_cents(str(data.get('amount', '')))
+    if amount_cents <= 0:
+        raise ValueError("金額必須是正數")
+    fields = {
+        "date": date_str,
+        "type": data['type'],
+        "category": category,
+        "description": str(data.get('description', '')).strip(),
+    }
+    return fields, amount_cents
+
+class LedgerAPIServer:
+    """
+    本機 HTTP/JSON API (asyncio)，讓收據掃描、銀行匯出等本機工具不經表單直接寫入帳本：
+        POST /transactions            新增一筆
+        POST /transactions/bulk       新增多筆 ({"transactions": [...]}，全部驗證通過才寫入)
+        GET  /transactions            依 start, end, category (可重複), keyword 查詢
+        GET  /summary/monthly         各月收入/支出 (分)
+        GET  /summary/category        各類別支出 (分)
+    同一時間窗內的寫入請求合併成一批，只重算一次餘額、存檔一次。
+    與視窗一起執行時，帳本操作一律排入 Tk 主執行緒執行 (Tk 與帳本都不是執行緒安全的)。
+    每個請求都必須帶 "Authorization: Bearer <權杖>" (權杖寫在 API_TOKEN_FILE)，Host 必須是本機名稱，
+    POST 的 Content-Type 必須是 application/json；網頁無法跨站送出這樣的請求 (CSRF)。
+    """
+
+    def __init__(self, app: ExpenseTrackerApp, host: str = API_HOST, port: int = API_PORT,
+                 token: Optional[str] = None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.token = token or secrets.token_urlsafe(32)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._calls: "queue.Queue" = queue.Queue() # 等待 Tk 執行緒執行的帳本操作
+        self._pending: List[tuple] = [] # 等待寫入的 (記錄列表, future)
+        self._flush_handle = None
+
+    # --- 帳本操作的執行位置 ---
+
+    async def call(self, func, *args):
+        """在帳本所屬的執行緒執行 func：無視窗時直接在事件迴圈中執行，否則交給 Tk 執行緒。"""
+        if self.app.master is None:
+            return func(*args)
+        future = concurrent.futures.Future()
+        self._calls.put((future, func, args))
+        return await asyncio.wrap_future(future)
+
+    def drain_calls(self):
+        """(Tk 執行緒) 執行 API 排入的帳本操作，並重新排程自己。"""
+        while True:
+            try:
+                future, func, args = self._calls.get_nowait()
+            except queue.Empty:
+                break
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(*args))
+                except Exception as e:
+                    future.set_exception(e)
+        self.app.master.after(API_POLL_MS, self.drain_calls)
+
+    # --- 批次寫入 ---
+
+    async def submit(self, entries: List[tuple]) -> List[Dict[str, Any]]:
+        """排入一批待新增的記錄，等待所屬批次寫入完成後回傳存檔格式的記錄。"""
+        future = self.loop.create_future()
+        self._pending.append((entries, future))
+        if self._flush_handle is None:
+            self._flush_handle = self.loop.call_later(API_BATCH_WINDOW, lambda: self.loop.create_task(self._flush()))
+        return await future
+
+    async def _flush(self):
+        self._flush_handle = None
+        batch, self._pending = self._pending, []
+        try:
+            records = await self.call(self._apply_batch, [e for entries, _ in batch for e in entries])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done(): # 用戶端已斷線時 future 會被取消
+                    future.set_exception(e)
+            return
+        start = 0
+        for entries, future in batch:
+            if not future.done():
+                future.set_result(records[start:start + len(entries)])
+            start += len(entries)
+
+    def _apply_batch(self, entries: List[tuple]) -> List[Dict[str, Any]]:
+        records = self.app.add_records(entries)
+        self.app.refresh_current_view()
+        return [self._serialize(r) for r in records]
+
+    # --- 查詢 ---
+
+    def _query(self, criteria) -> List[Dict[str, Any]]:
+        """
+        依條件篩選 (不影響視窗目前的篩選條件)；查詢範圍涵蓋未載入的封存年度時先載入，
+        並重新整理視窗的檢視 (「顯示全部記錄」的圖表才會改用載入後的記錄，而不是已移除的年度彙總)。
+        """
+        if self.app.sync_external_changes():
+            self.app.refresh_current_view()
+        if self.app.ensure_history_loaded(criteria[0]):
+            self.app.refresh_current_view()
+        return self.app.with_occurrences(self.app.filter_transactions(criteria), criteria)
+
+    def _serialize(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """回傳給用戶端的記錄 (週期交易的一次發生帶有 rule_id)，餘額含週期交易。"""
+        stored = dict(record) if 'rule_id' in record else self.app._record_for_storage(record)
+        stored['balance_cents'] = self.app.display_balance_cents(record)
+        return stored
+
+    def _list(self, criteria) -> Dict[str, Any]:
+        records = self._query(criteria)
+        return {'count': len(records), 'transactions': [self._serialize(r) for r in records]}
+
+    def _monthly_summary(self, criteria) -> Dict[str, Any]:
+        monthly: Dict[str, Dict[str, int]] = defaultdict(lambda: {'收入': 0, '支出': 0})
+        for r in self._query(criteria):
+            if r['type'] in ('收入', '支出'):
+                monthly[r['date'][:7]][r['type']] += self.app.amount_cents(r)
+        return {'monthly_cents': dict(sorted(monthly.items()))}
+
+    def _category_summary(self, criteria) -> Dict[str, Any]:
+        totals: Dict[str, int] = defaultdict(int)
+        for r in self._query(criteria):
+            if r['type'] == '支出':
+                totals[r['category']] += self.app.amount_cents(r)
+        return {'category_expense_cents': dict(sorted(totals.items(), key=lambda kv: -kv[1]))}
+
+    @staticmethod
+    def parse_criteria(query: str) -> tuple:
+        """查詢字串轉為 filter_transactions 的篩選條件；未指定日期時涵蓋全部記錄。"""
+        params = parse_qs(query)
+        dates = []
+        for name, default in (('start', '0001-01-01'), ('end', OPEN_END_DATE)):
+            if name not in params:
+                dates.append(default)
+                continue
+            value = params[name][-1]
+            try:
+                dates.append(ExpenseTrackerApp.normalize_date(value))
+            except ValueError:
+                raise ValueError(f"{name} 日期格式不正確: {value!r}")
+        categories = frozenset(c for v in params.get('category', []) for c in v.split(',') if c)
+        return (dates[0], dates[1], categories, params.get('keyword', [''])[-1].strip())
+
+    # --- HTTP ---
+
+    def check_request(self, method: str, headers: Dict[str, str]) -> Optional[tuple]:
+        """檢查 Host、權杖與 Content-Type；不允許時回傳 (HTTP 狀態碼, JSON 內容)，否則回傳 None。"""
+        host = headers.get('host', '')
+        host = host[:host.rindex(':')] if ':' in host else host
+        if host.lower() not in API_ALLOWED_HOSTS:
+            return HTTPStatus.FORBIDDEN, {'error': f"不接受的 Host: {headers.get('host', '')!r}"}
+        scheme, _, token = headers.get('authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(token.strip().encode(), self.token.encode()):
+            return HTTPStatus.UNAUTHORIZED, {'error': f"需要存取權杖 (見 {API_TOKEN_FILE})"}
+        if method == 'POST' and headers.get('content-type', '').split(';')[0].strip().lower() != 'application/json':
+            return HTTPStatus.UNSUPPORTED_MEDIA_TYPE, {'error': "Content-Type 必須是 application/json"}
+        return None
+
+    def write_token_file(self):
+        """把權杖寫入只有使用者本人可讀的檔案，供本機工具讀取。"""
+        fd = os.open(API_TOKEN_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(self.token)
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> tuple:
+        """依路徑分派請求，回傳 (HTTP 狀態碼, JSON 內容)。"""
+        url = urlsplit(target)
+        routes = {
+            '/transactions': ('GET', 'POST'),
+            '/transactions/bulk': ('POST',),
+            '/summary/monthly': ('GET',),
+            '/summary/category': ('GET',),
+        }
+        if url.path not in routes:
+            return HTTPStatus.NOT_FOUND, {'error': f"找不到 {url.path}"}
+        if method not in routes[url.path]:
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'error': f"{url.path} 不支援 {method}"}
+
+        if method == 'POST':
+            data = json.loads(body.decode('utf-8') or 'null')
+            if url.path == '/transactions':
+                records = await self.submit([parse_transaction_payload(data)])
+                return HTTPStatus.CREATED, {'transaction': records[0]}
+            items = data.get('transactions') if isinstance(data, dict) else data
+            if not isinstance(items, list):
+                raise ValueError("需要交易列表 ({\"transactions\": [...]})")
+            entries = []
+            for i, item in enumerate(items):
+                try:
+                    entries.append(parse_transaction_payload(item))
+                except ValueError as e:
+                    raise ValueError(f"第 {i} 筆: {e}")
+            records = await self.submit(entries)
+            return HTTPStatus.CREATED, {'count': len(records), 'transactions': records}
+
+        criteria = self.parse_criteria(url.query)
+        handler = {
+            '/transactions': self._list,
+            '/summary/monthly': self._monthly_summary,
+            '/summary/category': self._category_summary,
+        }[url.path]
+        return HTTPStatus.OK, await self.call(handler, criteria)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """處理一個連線的一個請求 (HTTP/1.1，回應後關閉連線)。"""
+        try:
+            request_line = await reader.readline()
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0))
+            rejected = self.check_request(method, headers)
+            if rejected is not None:
+                status, payload = rejected
+            elif length > API_MAX_BODY:
+                status, payload = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': "請求內容過大"}
+            else:
+                body = await reader.readexactly(length) if length else b''
+                status, payload = await self.dispatch(method, target, body)
+        except ValueError as e: # 包含 JSON 格式錯誤
+            status, payload = HTTPStatus.BAD_REQUEST, {'error': str(e)}
+        except Exception as e:
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        writer.write((f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                      "Content-Type: application/json; charset=utf-8\r\n"
+                      f"Content-Length: {len(data)}\r\n"
+                      "Connection: close\r\n\r\n").encode('latin-1') + data)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1] # port 為 0 時取得實際的埠號
+
+    async def serve(self):
+        """啟動並持續服務，直到被取消。"""
+        await self.start()
+        self.write_token_file()
+        print(f"本機 API 已啟動: http://{self.host}:{self.port} (存取權杖已寫入 {API_TOKEN_FILE})")
+        async with self._server:
+            await self._server.serve_forever()
 
-    def start_app():
-        global app
-        app = ExpenseTrackerApp(root)
+    def start_in_thread(self):
+        """與視窗一起執行：事件迴圈在背景執行緒，帳本操作由 Tk 執行緒處理。"""
+        threading.Thread(target=lambda: asyncio.run(self.serve()), daemon=True).start()
+        self.app.master.after(API_POLL_MS, self.drain_calls)
 
-    # 執行登入流程，成功後呼叫 start_app 啟動主應用程式
-    login = LoginWindow(root, start_app)
 
-    # 確保主視窗不會在登入前顯示
-    root.mainloop()
\ No newline at end of file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="金錢追蹤器")
+    parser.add_argument('--api', action='store_true', help="同時啟動本機 HTTP/JSON API")
+    parser.add_argument('--api-only', action='store_true', help="只啟動本機 API，不開啟視窗")
+    parser.add_argument('--port', type=int, default=API_PORT, help=f"API 埠號 (預設 {API_PORT})")
+    args = parser.parse_args()
+
+    if args.api_only:
+        ledger = ExpenseTrackerApp.headless()
+        try:
+            asyncio.run(LedgerAPIServer(ledger, port=args.port).serve())
+        except KeyboardInterrupt:
+            pass
+    else:
+        root = tk.Tk()
+        app = None
+
+        def start_app():
+            global app
+            app = ExpenseTrackerApp(root)
+            if args.api:
+                LedgerAPIServer(app, port=args.port).start_in_thread()
+
+        # 執行登入流程，成功後呼叫 start_app 啟動主應用程式
+        login = LoginWindow(root, start_app)
+
+        # 確保主視窗不會在登入前顯示
+        root.mainloop()
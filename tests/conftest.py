@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def ledger_dir(tmp_path, monkeypatch):
+    """在暫存目錄中執行：交易檔、封存、日誌與鎖檔都寫在這裡。"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,117 @@
+"""本機 HTTP/JSON API：以 port=0 啟動伺服器，透過本機連線送出請求。"""
+import asyncio
+import json
+
+import pytest
+
+import monay_notebook as mn
+
+
+async def request(server, method, path, payload=None, headers=None):
+    """送出一個 HTTP/1.1 請求，回傳 (狀態碼, JSON 內容)。headers 中值為 None 的標頭不送出。"""
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    sent = {
+        'Host': f"127.0.0.1:{server.port}",
+        'Authorization': f"Bearer {server.token}",
+        'Content-Type': 'application/json',
+        'Content-Length': str(len(body)),
+    }
+    sent.update(headers or {})
+    reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+    head = f"{method} {path} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in sent.items() if v is not None)
+    writer.write(head.encode('latin-1') + b"\r\n" + body)
+    response = await reader.read()
+    writer.close()
+    status_line, _, rest = response.partition(b"\r\n")
+    return int(status_line.split()[1]), json.loads(rest.partition(b"\r\n\r\n")[2])
+
+
+def run_with_server(scenario):
+    """在無視窗的帳本上啟動 API 伺服器並執行 scenario(server)。"""
+    async def main():
+        server = mn.LedgerAPIServer(mn.ExpenseTrackerApp.headless(), port=0)
+        await server.start()
+        try:
+            return await scenario(server)
+        finally:
+            server._server.close()
+    return asyncio.run(main())
+
+
+def transaction(description='午餐', amount='120.50', date='2026-3-5'):
+    return {'date': date, 'type': '支出', 'category': '飲食', 'amount': amount, 'description': description}
+
+
+def test_create_and_query(ledger_dir):
+    async def scenario(server):
+        status, created = await request(server, 'POST', '/transactions', transaction())
+        assert status == 201
+        assert created['transaction']['date'] == '2026-03-05' # 日期補零後儲存
+        assert created['transaction']['amount_cents'] == 12050
+
+        status, listed = await request(server, 'GET', '/transactions?start=2026-03-01&end=2026-03-31')
+        assert status == 200 and listed['count'] == 1
+
+        status, summary = await request(server, 'GET', '/summary/category')
+        assert summary == {'category_expense_cents': {'飲食': 12050}}
+    run_with_server(scenario)
+
+
+def test_concurrent_writes_are_saved_as_one_batch(ledger_dir, monkeypatch):
+    saves = []
+    original_save = mn.ExpenseTrackerApp.save_transactions
+    monkeypatch.setattr(mn.ExpenseTrackerApp, 'save_transactions',
+                        lambda self: saves.append(1) or original_save(self))
+
+    async def scenario(server):
+        results = await asyncio.gather(*(request(server, 'POST', '/transactions', transaction(f"#{i}"))
+                                         for i in range(5)))
+        assert [status for status, _ in results] == [201] * 5
+        assert len({body['transaction']['id'] for _, body in results}) == 5
+        return len(server.app.transactions)
+    assert run_with_server(scenario) == 5
+    assert len(saves) == 1
+
+
+def test_bulk_is_all_or_nothing(ledger_dir):
+    async def scenario(server):
+        status, body = await request(server, 'POST', '/transactions/bulk',
+                                     {'transactions': [transaction(), transaction(amount='-1')]})
+        assert status == 400 and body['error'].startswith('第 1 筆')
+        assert server.app.transactions == []
+
+        status, body = await request(server, 'POST', '/transactions/bulk', [transaction(), transaction()])
+        assert status == 201 and body['count'] == 2
+    run_with_server(scenario)
+
+
+@pytest.mark.parametrize('method, path, headers, expected', [
+    ('POST', '/transactions', {'Authorization': None}, 401),
+    ('POST', '/transactions', {'Authorization': 'Bearer wrong'}, 401),
+    ('POST', '/transactions', {'Host': 'evil.example.com'}, 403),
+    ('POST', '/transactions', {'Content-Type': 'text/plain'}, 415),
+    ('GET', '/nowhere', {}, 404),
+    ('DELETE', '/transactions', {}, 405),
+])
+def test_rejected_requests_do_not_touch_the_ledger(ledger_dir, method, path, headers, expected):
+    async def scenario(server):
+        status, body = await request(server, method, path, transaction(), headers)
+        assert status == expected and 'error' in body
+        assert server.app.transactions == []
+    run_with_server(scenario)
+
+
+def test_query_that_loads_archived_years_refreshes_the_view(ledger_dir, monkeypatch):
+    archived = mn.ExpenseTrackerApp.hot_year() - 1
+    mn.ExpenseTrackerApp.headless().add_records([
+        ({'date': f"{archived}-05-01", 'type': '支出', 'category': '飲食', 'description': 'old'}, 100)])
+    refreshed = []
+    monkeypatch.setattr(mn.ExpenseTrackerApp, 'refresh_current_view', lambda self: refreshed.append(1))
+
+    async def scenario(server):
+        assert server.app.unloaded_archive_years() == [archived]
+        status, listed = await request(server, 'GET', '/transactions') # 未指定 start：涵蓋所有封存年度
+        assert status == 200 and listed['count'] == 1
+        assert server.app.unloaded_archive_years() == []
+    run_with_server(scenario)
+    assert refreshed == [1]
@@ -0,0 +1,110 @@
+"""就地編輯只更新受影響的餘額，並以日誌記錄；結果必須與完整重算、重新載入一致。"""
+import datetime as dt
+import json
+import os
+import random
+
+import pytest
+
+import monay_notebook as mn
+
+HOT = dt.date.today().year
+
+
+def entry(day, amount_cents, kind='支出', description=''):
+    return ({'date': f"{HOT}-{day}", 'type': kind, 'category': '飲食', 'description': description}, amount_cents)
+
+
+def seeded_ledger():
+    ledger = mn.ExpenseTrackerApp.headless()
+    ledger.add_records([entry('01-01', 100000, '收入', 'salary')] +
+                       [entry(f"{m:02d}-15", 1000 * m, description=f"m{m}") for m in range(1, 10)])
+    return ledger
+
+
+def balances(ledger):
+    return [(r['id'], r['date'], ledger.balance_cents(r)) for r in ledger.transactions], ledger.balance
+
+
+def assert_matches_full_recompute(ledger):
+    incremental = balances(ledger)
+    ledger._recompute_all_balances()
+    assert balances(ledger) == incremental
+
+
+def edit(ledger, description, changes):
+    """與編輯視窗相同的流程：就地套用並寫入一筆日誌。"""
+    record = next(r for r in ledger.transactions if r['description'] == description)
+    ledger._mark_dirty(record)
+    ledger.apply_edit(record, changes)
+    ledger._mark_dirty(record)
+    ledger._ledger_changed()
+    ledger.append_journal({'op': 'edit', 'id': record['id'], 'fields': changes})
+    return record
+
+
+@pytest.mark.parametrize('changes', [
+    {'amount_cents': 1},                                     # 只改金額：差額加到其後每筆
+    {'type': '收入'},                                         # 只改類型
+    {'category': '交通', 'description': 'm5'},                # 不影響餘額
+    {'date': f"{HOT}-02-01"},                                 # 移到較早的位置
+    {'date': f"{HOT}-12-31"},                                 # 移到較晚的位置
+    {'date': f"{HOT}-02-01", 'amount_cents': 77},             # 移動並改金額
+    {'date': f"{HOT}-12-31", 'amount_cents': 12345, 'type': '收入'},
+    {'date': f"{HOT}-09-15"},                                 # 與既有記錄同一天
+])
+def test_edit_matches_full_recompute(ledger_dir, changes):
+    ledger = seeded_ledger()
+    edit(ledger, 'm5', changes)
+    assert_matches_full_recompute(ledger)
+
+
+def test_random_edits_match_full_recompute(ledger_dir):
+    rng = random.Random(20240601)
+    ledger = seeded_ledger()
+    for _ in range(200):
+        record = rng.choice(ledger.transactions)
+        changes = {}
+        if rng.random() < 0.5:
+            changes['date'] = (dt.date(HOT, 1, 1) + dt.timedelta(days=rng.randrange(365))).isoformat()
+        if rng.random() < 0.5:
+            changes['amount_cents'] = rng.randrange(1, 50000)
+        if rng.random() < 0.2:
+            changes['type'] = rng.choice(['收入', '支出'])
+        ledger.apply_edit(record, changes)
+        assert_matches_full_recompute(ledger)
+
+
+def test_edits_are_journaled_and_replayed_on_reload(ledger_dir):
+    ledger = seeded_ledger()
+    with open(mn.TRANSACTIONS_FILE, encoding='utf-8') as f:
+        saved = f.read()
+
+    edit(ledger, 'm2', {'amount_cents': 5})
+    edit(ledger, 'm7', {'date': f"{HOT}-01-02", 'description': 'moved'})
+    edit(ledger, 'moved', {'amount_cents': 999, 'type': '收入'})
+
+    # 只附加日誌，交易檔沒有被重寫
+    with open(mn.TRANSACTIONS_FILE, encoding='utf-8') as f:
+        assert f.read() == saved
+    with open(mn.JOURNAL_FILE, encoding='utf-8') as f:
+        assert [json.loads(line)['op'] for line in f] == ['edit'] * 3
+
+    reloaded = mn.ExpenseTrackerApp.headless()
+    assert balances(reloaded) == balances(ledger)
+    assert [r['description'] for r in reloaded.transactions] == [r['description'] for r in ledger.transactions]
+
+
+def test_journal_is_compacted_into_a_full_save(ledger_dir, monkeypatch):
+    monkeypatch.setattr(mn, 'JOURNAL_COMPACT_LIMIT', 3)
+    ledger = seeded_ledger()
+
+    for amount in (11, 22, 33):
+        edit(ledger, 'm4', {'amount_cents': amount})
+    assert os.path.exists(mn.JOURNAL_FILE)
+
+    edit(ledger, 'm4', {'amount_cents': 44}) # 超過上限：改為完整存檔並清空日誌
+    assert not os.path.exists(mn.JOURNAL_FILE)
+    reloaded = mn.ExpenseTrackerApp.headless()
+    assert balances(reloaded) == balances(ledger)
+    assert reloaded.amount_cents(next(r for r in reloaded.transactions if r['description'] == 'm4')) == 44
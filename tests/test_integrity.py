@@ -0,0 +1,77 @@
+"""每月校驗資料 (摘要與校驗鏈)：未修改時通過，手動修改時指出出問題的月份與記錄。"""
+import copy
+import json
+
+import monay_notebook as mn
+
+OPENING = 5000
+
+
+def stored_records():
+    """三個月、每月兩筆，餘額由 OPENING 起累計 (與存檔格式相同)。"""
+    records, balance = [], OPENING
+    for i, (date_str, kind, amount) in enumerate([
+            ('2025-01-05', '收入', 10000), ('2025-01-20', '支出', 2500),
+            ('2025-02-03', '支出', 1200), ('2025-02-28', '收入', 300),
+            ('2025-03-01', '支出', 999), ('2025-03-15', '支出', 1)], 1):
+        balance += amount if kind == '收入' else -amount
+        records.append({'id': i, 'date': date_str, 'type': kind, 'category': '其他', 'description': f"r{i}",
+                        'amount_cents': amount, 'balance_cents': balance})
+    return records
+
+
+def verify(records, periods):
+    return mn.verify_periods(records, periods, OPENING, 'test')
+
+
+def test_untouched_records_pass():
+    records = stored_records()
+    assert verify(records, mn.period_checksums(records, OPENING)) == []
+
+
+def test_edited_description_is_reported_for_its_month_only():
+    records = stored_records()
+    periods = mn.period_checksums(records, OPENING)
+    records[2]['description'] = 'edited'
+    problems = verify(records, periods)
+    assert len(problems) == 1 and '2025-02' in problems[0]
+
+
+def test_edited_amount_points_at_the_record():
+    records = stored_records()
+    periods = mn.period_checksums(records, OPENING)
+    records[1]['amount_cents'] = 2000 # 餘額沒有跟著改
+    problems = verify(records, periods)
+    assert len(problems) == 1
+    assert '2025-01' in problems[0] and 'id=2' in problems[0]
+
+
+def test_deleted_month_is_reported():
+    records = [r for r in stored_records() if not r['date'].startswith('2025-02')]
+    problems = verify(records, mn.period_checksums(stored_records(), OPENING))
+    assert any('2025-02' in p for p in problems)
+
+
+def test_tampered_checksums_break_the_chain():
+    records = stored_records()
+    periods = mn.period_checksums(records, OPENING)
+    tampered = copy.deepcopy(periods)
+    tampered[0]['closing_balance_cents'] += 100
+    assert any('校驗鏈中斷' in p for p in verify(records, tampered))
+
+
+def test_hand_edited_ledger_file_is_reported_on_load(ledger_dir, capsys):
+    ledger = mn.ExpenseTrackerApp.headless()
+    ledger.add_records([({'date': f"{mn.ExpenseTrackerApp.hot_year()}-01-0{d}", 'type': '支出',
+                          'category': '飲食', 'description': f"d{d}"}, 100 * d) for d in range(1, 4)])
+    capsys.readouterr()
+
+    with open(mn.TRANSACTIONS_FILE, encoding='utf-8') as f:
+        data = json.load(f)
+    data['transactions'][1]['amount_cents'] = 1
+    with open(mn.TRANSACTIONS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+    reloaded = mn.ExpenseTrackerApp.headless()
+    assert 'WARNING' in capsys.readouterr().out
+    assert reloaded.balance == -(100 + 1 + 300) # 餘額仍依金額重新計算
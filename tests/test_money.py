@@ -0,0 +1,81 @@
+"""整數分金額欄位：id 與欄位位置的對應、int64 範圍檢查與超出範圍時的還原。"""
+import json
+
+import pytest
+
+import monay_notebook as mn
+
+
+def entry(date_str, amount_cents, kind='收入', description=''):
+    return ({'date': date_str, 'type': kind, 'category': '薪資', 'description': description}, amount_cents)
+
+
+def test_columns_grow_with_record_count_not_ids(ledger_dir):
+    with open(mn.TRANSACTIONS_FILE, 'w', encoding='utf-8') as f:
+        json.dump({'transactions': [
+            {'id': 2000000000, 'date': '2026-03-05', 'type': '支出', 'category': '飲食', 'amount': 5},
+            {'id': 3, 'date': '2026-03-06', 'type': '收入', 'category': '薪資', 'amount': 9},
+        ]}, f)
+    ledger = mn.ExpenseTrackerApp.headless()
+    assert ledger.balance == 400
+    assert len(ledger.money.signed) == 2
+
+
+def test_amounts_outside_int64_are_rejected():
+    assert mn.to_cents('92233720368547758.07') == mn.MAX_CENTS
+    with pytest.raises(ValueError):
+        mn.to_cents('92233720368547758.08')
+    with pytest.raises(ValueError):
+        mn.to_cents('1e17')
+
+
+def test_add_that_overflows_the_balance_leaves_the_ledger_unchanged(ledger_dir):
+    ledger = mn.ExpenseTrackerApp.headless()
+    ledger.add_records([entry('2026-01-01', mn.MAX_CENTS)])
+
+    with pytest.raises(ValueError):
+        ledger.add_records([entry('2026-01-02', 1, description='overflow')])
+    assert len(ledger.transactions) == 1
+    assert ledger.balance == mn.MAX_CENTS
+
+    # 之後的新增、存檔與重新載入都不受影響
+    ledger.add_records([entry('2026-01-03', 100, '支出')])
+    reloaded = mn.ExpenseTrackerApp.headless()
+    assert [r['description'] for r in reloaded.transactions] == ['', '']
+    assert reloaded.balance == mn.MAX_CENTS - 100
+
+
+def test_edit_that_overflows_the_balance_is_rolled_back(ledger_dir):
+    ledger = mn.ExpenseTrackerApp.headless()
+    ledger.add_records([entry('2026-01-01', mn.MAX_CENTS - 10), entry('2026-01-05', 5, '支出'),
+                        entry('2026-01-09', 12)])
+    expense = ledger.transactions[1]
+    before = [(r['id'], r['date'], ledger.balance_cents(r)) for r in ledger.transactions]
+
+    for changes in ({'type': '收入'}, {'date': '2026-01-10', 'type': '收入'}):
+        with pytest.raises(ValueError):
+            ledger.apply_edit(expense, changes)
+        assert [(r['id'], r['date'], ledger.balance_cents(r)) for r in ledger.transactions] == before
+        assert (expense['type'], ledger.amount_cents(expense)) == ('支出', 5)
+
+    # 刪除這筆支出同樣會讓之後的餘額超出範圍
+    with pytest.raises(ValueError):
+        ledger.money.check_shift([ledger.transactions[2]['id']], -ledger.signed_cents(expense))
+
+
+def test_api_returns_400_when_the_balance_would_overflow(ledger_dir):
+    import asyncio
+    from test_api import request
+
+    async def scenario():
+        server = mn.LedgerAPIServer(mn.ExpenseTrackerApp.headless(), port=0)
+        await server.start()
+        try:
+            payload = {'date': '2026-01-01', 'type': '收入', 'category': '薪資', 'amount_cents': mn.MAX_CENTS}
+            assert (await request(server, 'POST', '/transactions', payload))[0] == 201
+            status, body = await request(server, 'POST', '/transactions', dict(payload, amount_cents=1))
+            assert status == 400 and 'error' in body
+            assert len(server.app.transactions) == 1
+        finally:
+            server._server.close()
+    asyncio.run(scenario())
@@ -0,0 +1,119 @@
+"""週期交易：發生日期與累計淨額 (與逐日展開的結果比對)、結束規則與多程式合併。"""
+import calendar
+import datetime as dt
+import itertools
+
+import pytest
+
+import monay_notebook as mn
+
+
+def rule(freq, start, end=None, amount_cents=100, kind='支出', description=''):
+    return {'start': start, 'end': end, 'freq': freq, 'type': kind, 'category': '其他',
+            'description': description, 'amount_cents': amount_cents}
+
+
+def naive_dates(r, until):
+    """逐一列舉發生日期 (每月規則遇到較短的月份取月底)。"""
+    start = dt.date.fromisoformat(r['start'])
+    last = min(until, dt.date.fromisoformat(r['end'])) if r['end'] else until
+    for n in itertools.count():
+        if r['freq'] == 'daily':
+            date_obj = start + dt.timedelta(days=n)
+        elif r['freq'] == 'weekly':
+            date_obj = start + dt.timedelta(weeks=n)
+        else:
+            month_index = start.month - 1 + n
+            year, month = start.year + month_index // 12, month_index % 12 + 1
+            date_obj = dt.date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+        if date_obj > last:
+            return
+        if date_obj.isoformat() not in r['exceptions']:
+            yield date_obj.isoformat()
+
+
+@pytest.mark.parametrize('freq, start, end', [
+    ('daily', '2024-02-27', None),
+    ('weekly', '2024-12-30', '2025-06-01'),
+    ('monthly', '2024-01-31', None), # 月底：2/29、4/30 ……
+    ('monthly', '2025-03-15', '2025-11-14'),
+])
+def test_dates_and_totals_match_enumeration(freq, start, end):
+    rules = mn.RecurringRules()
+    r = rules.add(rule(freq, start, end))
+    rules.skip(r['id'], next(naive_dates(r, dt.date(2026, 1, 1))))
+    until = dt.date(2025, 12, 31)
+    expected = list(naive_dates(r, until))
+
+    assert list(rules.dates(r, '2000-01-01', until.isoformat())) == expected
+    assert list(rules.dates(r, '2025-04-10', '2025-05-20')) == [d for d in expected if '2025-04-10' <= d <= '2025-05-20']
+    for probe in ('2023-12-31', start, '2024-03-31', '2025-02-28', until.isoformat()):
+        assert rules.total_until(probe) == -100 * sum(1 for d in expected if d <= probe)
+
+
+def test_end_before_keeps_past_occurrences():
+    rules = mn.RecurringRules()
+    r = rules.add(rule('monthly', '2026-01-15'))
+    rules.skip(r['id'], '2026-06-15')
+    rules.end_before(r['id'], '2026-05-15')
+
+    assert r['end'] == '2026-05-14' and r['exceptions'] == []
+    assert list(rules.dates(r, '2026-01-01', '2027-12-31')) == ['2026-01-15', '2026-02-15', '2026-03-15', '2026-04-15']
+
+    rules.end_before(r['id'], '2026-01-15') # 從第一次起結束：整個規則刪除
+    assert rules.rules == {}
+
+
+def test_explicit_filter_end_is_not_cut_at_the_horizon(ledger_dir):
+    ledger = mn.ExpenseTrackerApp.headless()
+    start = dt.date.today().replace(day=1)
+    ledger.recurring.add(rule('monthly', start.isoformat()))
+    far_end = f"{start.year + 3}-12-31"
+
+    shown = ledger.with_occurrences([], (start.isoformat(), far_end, frozenset(), ''))
+    assert len(shown) == 12 * 3 + 13 - start.month
+    horizon = (dt.date.today() + dt.timedelta(days=mn.RECURRING_PROJECTION_DAYS)).isoformat()
+    assert all(r['date'] <= horizon for r in ledger.all_view_records())
+
+
+def test_rules_from_two_instances_are_merged(ledger_dir):
+    a, b = mn.ExpenseTrackerApp.headless(), mn.ExpenseTrackerApp.headless()
+    a.recurring.add(rule('monthly', '2026-01-01', description='rent'))
+    a.save_recurring()
+    b.recurring.add(rule('weekly', '2026-01-01', description='gym')) # 與 a 的規則 id 相同
+    b.save_recurring()
+
+    assert a.sync_external_changes()
+    descriptions = sorted(r['description'] for r in mn.RecurringRules.load().rules.values())
+    assert descriptions == ['gym', 'rent']
+    assert sorted(r['description'] for r in a.recurring.rules.values()) == descriptions
+
+
+def test_unpadded_dates_in_rules_file_are_repaired(ledger_dir):
+    rules = mn.RecurringRules()
+    r = rules.add(rule('monthly', '2026-01-01'))
+    r['start'], r['end'] = '2026-3-5', '2026-9-5'
+    rules.save()
+
+    loaded = mn.RecurringRules.load().rules[r['id']]
+    assert (loaded['start'], loaded['end']) == ('2026-03-05', '2026-09-05')
+
+
+def test_charts_include_occurrences_in_unloaded_archive_years(ledger_dir):
+    archived = mn.ExpenseTrackerApp.hot_year() - 1
+    writer = mn.ExpenseTrackerApp.headless()
+    writer.add_records([({'date': f"{archived}-0{m}-10", 'type': '支出', 'category': '飲食', 'description': ''}, 500)
+                        for m in range(1, 4)])
+    writer.recurring.add(rule('monthly', f"{archived - 1}-11-01", amount_cents=2000, description='rent'))
+    writer.recurring.add(rule('monthly', f"{archived}-01-25", amount_cents=9000, kind='收入'))
+    writer.save_recurring()
+
+    ledger = mn.ExpenseTrackerApp.headless()
+    assert ledger.unloaded_archive_years() # 圖表使用封存索引的彙總
+    view = ledger.all_view_records()
+    with_rollups = (ledger.compute_category_totals(view), ledger.compute_monthly_totals(view))
+
+    ledger.ensure_history_loaded(f"{archived - 1}-01-01") # 載入後逐筆彙總，結果必須相同
+    view = ledger.all_view_records()
+    assert (ledger.compute_category_totals(view), ledger.compute_monthly_totals(view)) == with_rollups
+    assert with_rollups[1][f"{archived - 1}-12"] == {'收入': 0, '支出': 20.0}
@@ -0,0 +1,100 @@
+"""兩個程式 (以兩個無視窗的帳本模擬) 同時修改同一本帳時的增量合併。"""
+import datetime as dt
+
+import monay_notebook as mn
+
+HOT = dt.date.today().year
+ARCHIVED = HOT - 1
+
+
+def entry(date_str, description, amount_cents=100, kind='支出'):
+    return ({'date': date_str, 'type': kind, 'category': '飲食', 'description': description}, amount_cents)
+
+
+def seeded_ledger():
+    """去年每月一筆支出 (存檔時會移入封存)，今年數筆收入。"""
+    ledger = mn.ExpenseTrackerApp.headless()
+    ledger.add_records([entry(f"{ARCHIVED}-{m:02d}-10", f"old{m}", 100 * m) for m in range(1, 8)] +
+                       [entry(f"{HOT}-01-{d:02d}", f"new{d}", 1000, '收入') for d in range(1, 5)])
+    return ledger
+
+
+def open_with_history():
+    ledger = mn.ExpenseTrackerApp.headless()
+    ledger.ensure_history_loaded(f"{ARCHIVED}-01-01")
+    return ledger
+
+
+def move(ledger, description, date_str):
+    record = next(r for r in ledger.transactions if r['description'] == description)
+    ledger._mark_dirty(record)
+    ledger.apply_edit(record, {'date': date_str})
+    ledger._mark_dirty(record)
+    ledger._ledger_changed()
+    ledger.save_transactions()
+    return record
+
+
+def by_description(ledger):
+    return {r['description']: (r['id'], r['date']) for r in ledger.transactions}
+
+
+def test_record_moved_from_archive_to_hot_survives_merge(ledger_dir, capsys):
+    seeded_ledger()
+    a, b = open_with_history(), open_with_history()
+
+    moved = move(a, 'old3', f"{HOT}-02-01")
+    assert b.sync_external_changes()
+    # 只是換了年度：保留原本的 id 並套用新日期，不會被當成刪除或新增
+    assert by_description(b)['old3'] == (moved['id'], f"{HOT}-02-01")
+    assert len(b.transactions) == 11
+
+    b.save_transactions()
+    fresh = open_with_history()
+    assert by_description(fresh) == by_description(a)
+    assert fresh.balance == a.balance
+    assert 'WARNING' not in capsys.readouterr().out # 封存分段檔與索引一致
+
+
+def test_record_moved_from_hot_to_archive_survives_merge(ledger_dir, capsys):
+    seeded_ledger()
+    a, b = open_with_history(), open_with_history()
+
+    moved = move(a, 'new2', f"{ARCHIVED}-12-01")
+    assert b.sync_external_changes()
+    assert by_description(b)['new2'] == (moved['id'], f"{ARCHIVED}-12-01")
+
+    b.save_transactions()
+    fresh = open_with_history()
+    assert by_description(fresh) == by_description(a)
+    assert 'WARNING' not in capsys.readouterr().out
+
+
+def test_concurrent_additions_keep_both_records(ledger_dir):
+    seeded_ledger()
+    a, b = open_with_history(), open_with_history()
+
+    a.add_records([entry(f"{HOT}-03-01", 'from a')])
+    b.add_records([entry(f"{HOT}-03-02", 'from b')]) # 與 a 的新記錄 id 相同，合併時改派 id
+
+    fresh = open_with_history()
+    records = by_description(fresh)
+    assert {'from a', 'from b'} <= set(records)
+    assert len({record_id for record_id, _ in records.values()}) == len(records)
+
+
+def test_external_deletion_is_merged(ledger_dir):
+    seeded_ledger()
+    a, b = open_with_history(), open_with_history()
+
+    record = next(r for r in a.transactions if r['description'] == 'old5')
+    a.transactions.remove(record)
+    a._unregister_record(record)
+    a._mark_dirty(record)
+    a._ledger_changed()
+    a._recompute_all_balances()
+    a.save_transactions()
+
+    assert b.sync_external_changes()
+    assert 'old5' not in by_description(b)
+    assert b.balance == a.balance